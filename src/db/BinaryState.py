@@ -0,0 +1,182 @@
+"""
+Binary simulation state with fixed-width, memory-mapped plane records.
+
+Layout (little-endian):
+    header   MAGIC, plane count, record size, metadata offset, metadata length
+    records  one fixed-width record per plane, in state order:
+             altitude (int32), changes (int32), aircraft speed (float64)
+    metadata the fields the resolver never changes (ACID, route, airports, ...)
+             as compact JSON, read once on load; record fields are kept as
+             null placeholders so planes come back in their original key order
+
+The resolver only ever changes altitude, speed and the change counter, so an
+update is a 16-byte write into the mmapped record instead of re-serializing
+the whole state. simulation_state.json stays the format the dashboard reads;
+export_json() writes it from the binary file.
+"""
+
+import json
+import mmap
+import os
+import struct
+import tempfile
+
+from Instrumentation import metrics
+
+MAGIC = b"SIMSTAT1"
+HEADER = struct.Struct("<8sIIQQ")
+RECORD = struct.Struct("<iid")
+MISSING = -1  # altitude/changes not present in the source plane
+
+# Fields stored in the fixed-width records rather than the metadata
+RECORD_FIELDS = ("altitude", "changes", "aircraft speed")
+
+BINARY_SUFFIX = ".bin"
+
+
+def is_binary_state(path):
+    """True if path is a binary state file (checked by magic, not extension)."""
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def write_binary_state(path, planes):
+    """Write planes (list of dicts) as a binary state file, atomically."""
+    # Imported here: SimulationState itself imports this module
+    from SimulationState import replace_mode
+    meta = []
+    records = bytearray(RECORD.size * len(planes))
+    for idx, plane in enumerate(planes):
+        meta.append({key: None if key in RECORD_FIELDS else value for key, value in plane.items()})
+        RECORD.pack_into(records, idx * RECORD.size,
+                         plane.get("altitude", MISSING),
+                         plane.get("changes", MISSING),
+                         plane["aircraft speed"])
+    meta_bytes = json.dumps(meta, separators=(",", ":")).encode("utf-8")
+    meta_offset = HEADER.size + len(records)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=BINARY_SUFFIX)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, len(planes), RECORD.size, meta_offset, len(meta_bytes)))
+            f.write(records)
+            f.write(meta_bytes)
+        os.chmod(tmp_path, replace_mode(path))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class BinaryStateFile:
+    """Memory-mapped binary state; plane records are read and patched in place."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "r+b")
+        self._mm = mmap.mmap(self._file.fileno(), 0)
+        magic, self.count, record_size, meta_offset, meta_length = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a binary state file")
+        if record_size != RECORD.size:
+            self.close()
+            raise ValueError(f"{path}: unsupported record size {record_size}")
+        self.meta = json.loads(self._mm[meta_offset:meta_offset + meta_length].decode("utf-8"))
+        self.rows = {plane["ACID"]: idx for idx, plane in enumerate(self.meta)}
+        self.bytes_written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def _offset(self, row):
+        if not 0 <= row < self.count:
+            raise IndexError("plane row out of range")
+        return HEADER.size + row * RECORD.size
+
+    def record(self, row):
+        """(altitude, changes, speed) for a row; MISSING for absent fields."""
+        return RECORD.unpack_from(self._mm, self._offset(row))
+
+    def plane(self, row):
+        """One plane as a dict in the simulation_state.json format (same key order)."""
+        altitude, changes, speed = self.record(row)
+        plane = dict(self.meta[row])
+        # Assigning to a placeholder keeps its position; fields the source plane
+        # didn't have go at the end, as they would in the JSON state
+        for key, value in (("altitude", altitude), ("aircraft speed", speed), ("changes", changes)):
+            if value == MISSING and key != "aircraft speed":
+                plane.pop(key, None)
+            else:
+                plane[key] = value
+        return plane
+
+    def planes(self):
+        return [self.plane(row) for row in range(self.count)]
+
+    def patch(self, row, altitude=None, speed=None, changes=None):
+        """Overwrite one plane's record in place (None keeps the current value)."""
+        old_altitude, old_changes, old_speed = self.record(row)
+        RECORD.pack_into(self._mm, self._offset(row),
+                         old_altitude if altitude is None else altitude,
+                         old_changes if changes is None else changes,
+                         old_speed if speed is None else speed)
+        self.bytes_written += RECORD.size
+        metrics.count("bytes_written", RECORD.size)
+
+    def patch_plane(self, plane):
+        """Write a plane dict's altitude/speed/changes into its record."""
+        self.patch(self.rows[plane["ACID"]],
+                   altitude=plane.get("altitude", MISSING),
+                   speed=plane["aircraft speed"],
+                   changes=plane.get("changes", MISSING))
+
+    def flush(self):
+        self._mm.flush()
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def json_to_binary(json_path, binary_path):
+    with open(json_path, "r") as f:
+        write_binary_state(binary_path, json.load(f))
+
+
+def export_json(binary_path, json_path):
+    """Write the JSON state the dashboard reads from a binary state file."""
+    from SimulationState import write_json_atomic
+    with BinaryStateFile(binary_path) as state:
+        write_json_atomic(json_path, state.planes())
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Usage: python BinaryState.py to-binary simulation_state.json simulation_state.bin
+    #        python BinaryState.py to-json simulation_state.bin simulation_state.json
+    if len(sys.argv) != 4 or sys.argv[1] not in ("to-binary", "to-json"):
+        print("Usage: python BinaryState.py to-binary|to-json SOURCE DEST")
+        sys.exit(1)
+    command, source, dest = sys.argv[1:]
+    if command == "to-binary":
+        json_to_binary(source, dest)
+    else:
+        export_json(source, dest)
+    print(f"Wrote {dest} ({os.path.getsize(dest)} bytes)")
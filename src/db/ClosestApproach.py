@@ -0,0 +1,210 @@
+"""
+Continuous conflict detection using closest point of approach (CPA).
+
+Instead of sampling positions every ping_int minutes, every pair of
+time-overlapping flights is checked leg by leg: each great-circle leg is
+split into short straight (chord) segments flown at constant velocity, and
+for each pair of simultaneous segments the relative-motion CPA gives the
+exact time window where horizontal separation is below minima. Altitude is
+constant per flight, so the vertical check is done once per pair.
+"""
+
+import math
+from bisect import bisect_right
+
+from ConflictFinder import HORIZONTAL_SEPARATION_NM, VERTICAL_SEPARATION_FT
+from IntervalIndex import IntervalIndex
+
+EARTH_RADIUS_NM = 3440.065
+
+# Longest straight segment used to approximate a great-circle leg. A 50 NM
+# chord deviates from the arc by ~0.1 NM, well inside the 5 NM minima.
+MAX_SEGMENT_NM = 50.0
+
+
+# -------------------- Geometry -------------------- #
+
+def _to_xyz(lat, lon):
+    """Lat/lon (deg) -> Earth-centred cartesian point in NM."""
+    phi, lam = math.radians(lat), math.radians(lon)
+    return (EARTH_RADIUS_NM * math.cos(phi) * math.cos(lam),
+            EARTH_RADIUS_NM * math.cos(phi) * math.sin(lam),
+            EARTH_RADIUS_NM * math.sin(phi))
+
+
+def _slerp_xyz(p1, p2, fraction):
+    """Point at fraction along the great circle between two cartesian points."""
+    dot = sum(a * b for a, b in zip(p1, p2)) / (EARTH_RADIUS_NM ** 2)
+    d = math.acos(max(-1.0, min(1.0, dot)))
+    if d == 0:
+        return p1
+    a = math.sin((1 - fraction) * d) / math.sin(d)
+    b = math.sin(fraction * d) / math.sin(d)
+    return tuple(a * c1 + b * c2 for c1, c2 in zip(p1, p2))
+
+
+def trajectory_segments(traj, max_segment_nm: float = MAX_SEGMENT_NM):
+    """
+    Split a compiled Trajectory into constant-velocity straight segments.
+
+    Returns: list of (t_start, t_end, start_xyz, velocity_xyz) with times in
+    unix seconds and velocity in NM per second, ordered by time.
+    """
+    segments = []
+    seconds_per_nm = 3600.0 / traj.speed
+    cum_dist = 0.0
+    for leg_idx, leg_dist in enumerate(traj.leg_distances):
+        start_xyz = _to_xyz(*traj.path[leg_idx])
+        end_xyz = _to_xyz(*traj.path[leg_idx + 1])
+        n_pieces = max(1, math.ceil(leg_dist / max_segment_nm))
+
+        prev_xyz = start_xyz
+        prev_t = traj.departure_unix + cum_dist * seconds_per_nm
+        for piece in range(1, n_pieces + 1):
+            next_xyz = end_xyz if piece == n_pieces else _slerp_xyz(start_xyz, end_xyz, piece / n_pieces)
+            next_t = traj.departure_unix + (cum_dist + leg_dist * piece / n_pieces) * seconds_per_nm
+            dt = next_t - prev_t
+            if dt > 0:
+                velocity = tuple((n - p) / dt for n, p in zip(next_xyz, prev_xyz))
+                segments.append((prev_t, next_t, prev_xyz, velocity))
+            prev_xyz, prev_t = next_xyz, next_t
+        cum_dist += leg_dist
+    return segments
+
+
+def _bounding_box(segments):
+    """Axis-aligned cartesian box around a list of segments."""
+    lo = [math.inf] * 3
+    hi = [-math.inf] * 3
+    for t0, t1, p0, v in segments:
+        for axis in range(3):
+            a = p0[axis]
+            b = p0[axis] + v[axis] * (t1 - t0)
+            lo[axis] = min(lo[axis], a, b)
+            hi[axis] = max(hi[axis], a, b)
+    return lo, hi
+
+
+def _boxes_within(box_a, box_b, margin):
+    (lo_a, hi_a), (lo_b, hi_b) = box_a, box_b
+    return all(lo_a[axis] - margin <= hi_b[axis] and lo_b[axis] - margin <= hi_a[axis]
+               for axis in range(3))
+
+
+# -------------------- Pairwise CPA -------------------- #
+
+def pair_conflict_windows(segments_a, segments_b, radius_nm: float = HORIZONTAL_SEPARATION_NM):
+    """
+    Time windows where two flights are closer than radius_nm horizontally.
+
+    Walks both segment lists in time order and solves the relative-motion
+    quadratic |r0 + dv * tau| < radius for each simultaneous segment pair.
+    Returns: list of (start_unix, end_unix, min_distance_nm), merged so that
+    touching windows become one.
+    """
+    windows = []
+    if not segments_a or not segments_b:
+        return windows
+    r_sq = radius_nm * radius_nm
+
+    # Jump straight to the first segments that overlap in time
+    overlap_start = max(segments_a[0][0], segments_b[0][0])
+    overlap_end = min(segments_a[-1][1], segments_b[-1][1])
+    i = bisect_right([seg[1] for seg in segments_a], overlap_start)
+    j = bisect_right([seg[1] for seg in segments_b], overlap_start)
+
+    while i < len(segments_a) and j < len(segments_b):
+        ta0, ta1, pa, va = segments_a[i]
+        tb0, tb1, pb, vb = segments_b[j]
+        start = ta0 if ta0 > tb0 else tb0
+        if start >= overlap_end:
+            break
+        end = ta1 if ta1 < tb1 else tb1
+
+        if start < end:
+            # Relative position at the start of the overlap, and relative velocity
+            da, db = start - ta0, start - tb0
+            rx = (pa[0] + va[0] * da) - (pb[0] + vb[0] * db)
+            ry = (pa[1] + va[1] * da) - (pb[1] + vb[1] * db)
+            rz = (pa[2] + va[2] * da) - (pb[2] + vb[2] * db)
+            dvx, dvy, dvz = va[0] - vb[0], va[1] - vb[1], va[2] - vb[2]
+            a = dvx * dvx + dvy * dvy + dvz * dvz
+            b = 2 * (rx * dvx + ry * dvy + rz * dvz)
+            c = rx * rx + ry * ry + rz * rz - r_sq
+            duration = end - start
+
+            # Closest approach within this overlap
+            tau_cpa = min(max(-b / (2 * a), 0.0), duration) if a > 0 else 0.0
+            min_dist_sq = a * tau_cpa * tau_cpa + b * tau_cpa + c + r_sq
+
+            if min_dist_sq < r_sq:
+                if a > 0:
+                    root = math.sqrt(max(b * b - 4 * a * c, 0.0))
+                    tau_in = max((-b - root) / (2 * a), 0.0)
+                    tau_out = min((-b + root) / (2 * a), duration)
+                else:
+                    tau_in, tau_out = 0.0, duration
+                w_start, w_end = start + tau_in, start + tau_out
+                min_dist = math.sqrt(max(min_dist_sq, 0.0))
+
+                if windows and w_start <= windows[-1][1] + 1e-6:
+                    prev_start, prev_end, prev_min = windows[-1]
+                    windows[-1] = (prev_start, max(prev_end, w_end), min(prev_min, min_dist))
+                else:
+                    windows.append((w_start, w_end, min_dist))
+
+        # Advance whichever segment finishes first
+        if ta1 <= tb1:
+            i += 1
+        else:
+            j += 1
+    return windows
+
+
+# -------------------- Detection -------------------- #
+
+def overlapping_pairs(trajectories):
+    """Yield (i, j) index pairs of flights whose airborne intervals overlap."""
+    index = IntervalIndex((idx, traj.departure_unix, traj.departure_unix + traj.total_minutes * 60)
+                          for idx, traj in enumerate(trajectories))
+    for i, j in index.overlapping_pairs():
+        yield (i, j) if i < j else (j, i)
+
+
+def detect_conflicts_cpa(trajectories, sim_start_unix: int):
+    """
+    Continuous pairwise conflict detection over compiled trajectories.
+
+    Returns: list of events sorted by start time:
+        {"acids": [ACID1, ACID2], "start": minutes, "end": minutes,
+         "min_distance_nm": float}
+    where start/end are minutes since sim_start_unix.
+    """
+    segments = [trajectory_segments(traj) for traj in trajectories]
+    boxes = [_bounding_box(segs) if segs else None for segs in segments]
+
+    events = []
+    for i, j in overlapping_pairs(trajectories):
+        traj_a, traj_b = trajectories[i], trajectories[j]
+        if abs(traj_a.altitude - traj_b.altitude) >= VERTICAL_SEPARATION_FT:
+            continue
+        if boxes[i] is None or boxes[j] is None:
+            continue
+        if not _boxes_within(boxes[i], boxes[j], HORIZONTAL_SEPARATION_NM):
+            continue
+
+        for start, end, min_dist in pair_conflict_windows(segments[i], segments[j]):
+            events.append({
+                "acids": [traj_a.acid, traj_b.acid],
+                "start": (start - sim_start_unix) / 60,
+                "end": (end - sim_start_unix) / 60,
+                "min_distance_nm": min_dist
+            })
+
+    events.sort(key=lambda e: e["start"])
+    return events
+
+
+def events_to_conflicts(events):
+    """Convert CPA events to the conflicts.json format: [ACID1, ACID2, minute]."""
+    return [event["acids"] + [int(math.floor(event["start"]))] for event in events]
@@ -0,0 +1,87 @@
+"""
+Conflict-event aggregation and deduplication.
+
+Raw detection output has one [ACID1, ACID2, ..., timestamp] entry per cluster
+per tick, so a long-lived conflict repeats for dozens of consecutive ticks.
+Consecutive ticks of the same cluster are merged into one event with a start,
+end and duration, and clusters contained in a larger one are dropped using an
+inverted ACID index instead of scanning every kept cluster.
+"""
+
+
+class SupersetIndex:
+    """Inverted ACID -> kept-cluster index for fast 'is this a subset?' checks."""
+
+    def __init__(self):
+        self._clusters_by_acid = {}
+        self._count = 0
+
+    def add(self, acids):
+        cluster_id = self._count
+        self._count += 1
+        for acid in acids:
+            self._clusters_by_acid.setdefault(acid, set()).add(cluster_id)
+
+    def has_superset(self, acids):
+        """True if some kept cluster contains every ACID in acids."""
+        postings = []
+        for acid in acids:
+            clusters = self._clusters_by_acid.get(acid)
+            if not clusters:
+                return False
+            postings.append(clusters)
+        postings.sort(key=len)
+        common = set(postings[0])
+        for clusters in postings[1:]:
+            common &= clusters
+            if not common:
+                return False
+        return bool(common)
+
+
+def aggregate_conflict_events(conflicts, ping_int: int = 1):
+    """
+    Merge consecutive ticks of the same cluster into events.
+
+    conflicts: raw [ACID1, ..., timestamp] entries (timestamp in minutes)
+    Returns: events in order of first appearance:
+        {"acids": [...], "start": minutes, "end": minutes, "duration": minutes}
+    Each tick counts for ping_int minutes, so a single-tick event lasts ping_int.
+    """
+    events = []
+    open_events = {}
+    for conflict in sorted(conflicts, key=lambda c: c[-1]):
+        acids, timestamp = conflict[:-1], conflict[-1]
+        key = frozenset(acids)
+        event = open_events.get(key)
+        if event is not None and timestamp - event["end"] <= ping_int:
+            event["end"] = max(event["end"], timestamp)
+        else:
+            event = {"acids": list(acids), "start": timestamp, "end": timestamp}
+            open_events[key] = event
+            events.append(event)
+
+    for event in events:
+        event["duration"] = event["end"] - event["start"] + ping_int
+    return events
+
+
+def dedupe_events(events):
+    """
+    Keep the largest clusters; drop any event whose ACIDs are a subset of a kept one.
+
+    Same rule as the old pairwise issubset scan: larger clusters first, and
+    for equal sizes the earliest event wins.
+    """
+    kept = []
+    index = SupersetIndex()
+    for event in sorted(events, key=lambda e: -len(e["acids"])):
+        if not index.has_superset(event["acids"]):
+            index.add(event["acids"])
+            kept.append(event)
+    return kept
+
+
+def events_to_conflict_list(events):
+    """Events -> conflicts.json format: [ACID1, ..., start timestamp]."""
+    return [event["acids"] + [event["start"]] for event in events]
@@ -1,13 +1,17 @@
 import math
-import json
-import os
 
-# Path to your JSON file
-db_path = os.path.join(os.path.dirname(__file__), "waypointToAcids.json")
+from Instrumentation import metrics
+from WaypointIndex import load_waypoint_index
 
-# Load the JSON into waypoint_dict
-with open(db_path, "r") as f:
-    waypoint_dict = json.load(f)
+# Waypoint -> ACIDs for flights.json; loaded on first use, not at import
+_default_waypoints = None
+
+def default_waypoints():
+    """Waypoint -> ACIDs map for flights.json, rebuilt if flights.json changed (see WaypointIndex)."""
+    global _default_waypoints
+    if _default_waypoints is None:
+        _default_waypoints = load_waypoint_index()
+    return _default_waypoints
 
 
 # -------------------- Basic geometry -------------------- #
@@ -25,13 +29,58 @@ def haversine_distance(lat1, lon1, lat2, lon2):
     return 3440.065 * c  # nautical miles
 
 
+# Separation minima
+HORIZONTAL_SEPARATION_NM = 5
+VERTICAL_SEPARATION_FT = 2000
+
+
 def check_hitbox_collision(plane1, plane2):
     """Return True if planes violate separation minima."""
     horizontal_distance = haversine_distance(
         plane1["lat"], plane1["lon"], plane2["lat"], plane2["lon"]
     )
     vertical_separation = abs(plane1["alt"] - plane2["alt"])
-    return horizontal_distance < 5 and vertical_separation < 2000
+    return (horizontal_distance < HORIZONTAL_SEPARATION_NM
+            and vertical_separation < VERTICAL_SEPARATION_FT)
+
+
+# -------------------- Spatial grid (broad phase) -------------------- #
+
+def build_spatial_grid(planes):
+    """
+    Bucket planes into lat/lon/altitude cells at least one separation radius wide.
+
+    Any two planes within separation minima are in the same or adjacent cells,
+    so only the 3x3x3 neighbourhood needs the exact haversine check.
+    Returns: (grid dict cell -> list of plane indices, cell key function)
+    """
+    # 5 NM of latitude; longitude cells are widened for the highest latitude
+    # present (plus a margin) so they are never narrower than 5 NM
+    lat_step = HORIZONTAL_SEPARATION_NM / 60.0
+    max_abs_lat = max(abs(plane["lat"]) for plane in planes)
+    lon_step = lat_step * 1.1 / max(math.cos(math.radians(min(max_abs_lat + 1.0, 89.0))), 1e-6)
+    alt_step = VERTICAL_SEPARATION_FT
+
+    def cell_of(plane):
+        return (math.floor(plane["lat"] / lat_step),
+                math.floor(plane["lon"] / lon_step),
+                math.floor(plane["alt"] / alt_step))
+
+    grid = {}
+    for idx, plane in enumerate(planes):
+        grid.setdefault(cell_of(plane), []).append(idx)
+    return grid, cell_of
+
+
+def neighbour_indices(grid, cell):
+    """Yield plane indices in the given cell and its 26 neighbours."""
+    ci, cj, ck = cell
+    for di in (-1, 0, 1):
+        for dj in (-1, 0, 1):
+            for dk in (-1, 0, 1):
+                bucket = grid.get((ci + di, cj + dj, ck + dk))
+                if bucket:
+                    yield from bucket
 
 
 # -------------------- Conflict detection -------------------- #
@@ -44,7 +93,13 @@ def find_conflict_clusters(planes):
     Returns: list of clusters (list of plane dicts)
     """
     conflicts = []
+    if not planes:
+        return conflicts
+
+    grid, cell_of = build_spatial_grid(planes)
+    cells = [cell_of(plane) for plane in planes]
     unvisited = set(range(len(planes)))
+    checks = 0
 
     while unvisited:
         cluster_indices = set()
@@ -53,7 +108,13 @@ def find_conflict_clusters(planes):
         while to_visit:
             idx = to_visit.pop()
             cluster_indices.add(idx)
-            for other_idx in list(unvisited):
+            # Only planes in neighbouring cells can be within separation minima.
+            # Visit them in index order so clusters come out in the same order
+            # as a full scan over the unvisited planes.
+            candidates = sorted(other_idx for other_idx in neighbour_indices(grid, cells[idx])
+                                if other_idx in unvisited)
+            checks += len(candidates)
+            for other_idx in candidates:
                 if check_hitbox_collision(planes[idx], planes[other_idx]):
                     to_visit.add(other_idx)
                     unvisited.remove(other_idx)
@@ -61,44 +122,94 @@ def find_conflict_clusters(planes):
         if len(cluster_indices) > 1:
             conflicts.append([planes[i] for i in cluster_indices])
 
+    # One haversine per pair check; counted once per call, not per pair
+    metrics.count("pair_checks", checks)
+    metrics.count("haversine_calls", checks)
     return conflicts
 
 
+# -------------------- Waypoint candidate graph -------------------- #
+
+class WaypointCandidates:
+    """
+    Waypoint index compiled once into per-plane lookups.
+
+    waypoints_of: ACID -> [(waypoint index, position in that waypoint's ACID
+    list), ...] in waypoint order, used to find candidates per tick from the
+    airborne planes alone and to keep the legacy candidate order.
+    """
+
+    def __init__(self, waypoints=None):
+        if waypoints is None:
+            waypoints = default_waypoints()
+        self.waypoints_of = {}
+        for wp_idx, acids in enumerate(waypoints.values()):
+            for pos, acid in enumerate(acids):
+                entries = self.waypoints_of.setdefault(acid, [])
+                if not entries or entries[-1][0] != wp_idx:
+                    entries.append((wp_idx, pos))
+
+    def candidates(self, plane_map):
+        """
+        Planes that share a waypoint with another airborne plane.
+
+        Ordered as the legacy per-waypoint scan produced them: by the first
+        waypoint (in index order) that has two or more airborne planes, then
+        by position in that waypoint's list.
+        """
+        airborne_at = {}
+        for acid in plane_map:
+            for wp_idx, _ in self.waypoints_of.get(acid, ()):
+                airborne_at[wp_idx] = airborne_at.get(wp_idx, 0) + 1
+
+        keyed = []
+        for acid, plane in plane_map.items():
+            for wp_idx, pos in self.waypoints_of.get(acid, ()):
+                if airborne_at[wp_idx] >= 2:
+                    keyed.append(((wp_idx, pos), plane))
+                    break
+        keyed.sort(key=lambda item: item[0])
+        return [plane for _, plane in keyed]
+
+
+_default_candidates = None
+
+def default_candidates():
+    """Candidates for the flights.json waypoint index, compiled once."""
+    global _default_candidates
+    if _default_candidates is None:
+        _default_candidates = WaypointCandidates(default_waypoints())
+    return _default_candidates
+
+
 # -------------------- Waypoint-based optimized detection -------------------- #
 
-def detect_conflicts_by_waypoints(planes_list, timestamp):
+def detect_conflicts_by_waypoints(planes_list, timestamp, candidates=None):
     """
     Detect conflicts using waypoint filtering and merge overlapping clusters.
 
     planes_list: list of dicts with 'ACID', 'lat', 'lon', 'alt'
-    waypoint_dict: dict mapping waypoint -> list of ACIDs
     timestamp: snapshot time
+    candidates: optional WaypointCandidates compiled for these flights
+                (defaults to one built from flights.json)
 
     Returns:
         conflicts: list of clusters [ACID1, ACID2, ..., timestamp]
     """
+    if candidates is None:
+        candidates = default_candidates()
+
     # Map ACID -> plane dict for quick lookup
     plane_map = {plane['ACID']: plane for plane in planes_list}
 
-    # Step 1: Build candidate lists per waypoint
-    waypoint_groups = []
-    for wp, acids in waypoint_dict.items():
-        planes_in_air = [plane_map[acid] for acid in acids if acid in plane_map]
-        if len(planes_in_air) > 1:
-            waypoint_groups.append(planes_in_air)
-
-    # Step 2: Flatten all planes into a single list for cluster detection
-    all_planes = []
-    for group in waypoint_groups:
-        all_planes.extend(group)
-
-    # Remove duplicates (same plane in multiple waypoints)
-    all_planes = list({plane['ACID']: plane for plane in all_planes}.values())
+    # Step 1: Planes sharing a waypoint with another airborne plane, looked up in
+    # the precompiled graph instead of a pass over every waypoint in the index
+    all_planes = candidates.candidates(plane_map)
 
-    # Step 3: Find conflict clusters
+    # Step 2: Find conflict clusters
     clusters = find_conflict_clusters(all_planes)
 
-    # Step 4: Convert to output format: [ACID1, ACID2, ..., timestamp]
+    # Step 3: Convert to output format: [ACID1, ACID2, ..., timestamp]
     conflicts_output = []
     for cluster in clusters:
         conflict_ids = [plane['ACID'] for plane in cluster]
@@ -1,6 +1,9 @@
 import json
 import os
 
+from Instrumentation import metrics
+from SimulationState import SimulationState, write_json_atomic
+
 # Get the directory where this script is located
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -12,12 +15,12 @@ AIRCRAFT_TYPES_FILE = os.path.join(SCRIPT_DIR, "plane_info.json")
 # JSON LOAD / SAVE HELPERS
 # -----------------------------
 def load_state():
-    with open(STATE_FILE, "r") as f:
+    with metrics.stage("load_state"), open(STATE_FILE, "r") as f:
+        metrics.count("bytes_read", os.fstat(f.fileno()).st_size)
         return json.load(f)
 
 def save_state(state):
-    with open(STATE_FILE, "w") as f:
-        json.dump(state, f, indent=2)
+    write_json_atomic(STATE_FILE, state)
 
 def load_planes_info():
     """Return dict of ACID -> plane type"""
@@ -44,39 +47,54 @@ def horizontal_separation_ok(pos1, pos2):
 # -----------------------------
 # STATE UPDATE
 # -----------------------------
-def update_plane(acid, new_altitude=None, new_speed=None):
+def update_plane(acid, new_altitude=None, new_speed=None, state=None):
     """
-    Updates altitude/speed in the list-of-dicts format and increments changes
+    Updates altitude/speed in the list-of-dicts format and increments changes.
+
+    With an in-memory SimulationState the change stays in memory until
+    state.flush(); without one the state file is loaded and saved directly.
     """
-    state = load_state()
-    for plane in state:
-        if plane["ACID"] == acid:
-            if new_altitude is not None:
-                plane["altitude"] = new_altitude
-            if new_speed is not None:
-                plane["aircraft speed"] = new_speed
-            plane["changes"] += 1
-            break
-    save_state(state)
+    if state is not None:
+        state.update_plane(acid, new_altitude=new_altitude, new_speed=new_speed)
+        return
+    state = SimulationState.load(STATE_FILE)
+    state.update_plane(acid, new_altitude=new_altitude, new_speed=new_speed)
+    state.flush()
 
 # -----------------------------
 # CONFLICT RESOLVER
 # -----------------------------
-def conflict_resolver(conflicts):
+def conflict_resolver(conflicts, state=None, evaluator=None):
     """
     Resolves altitude and speed conflicts between planes.
     
     Args:
         conflicts: a list of lists, where each inner list represents a group of planes
                   in conflict. The last item in each sublist is a timestamp and is discarded.
+        state: optional in-memory SimulationState. If omitted, simulation_state.json is
+               loaded once and written back once at the end of the pass.
+        evaluator: optional ManeuverEvaluator for the same state. Moves that would put a
+                   plane in conflict with an aircraft it isn't already in conflict with
+                   are skipped, and the next option is tried instead.
     """
     # Load aircraft constraints
     aircraft_types = load_aircraft_types()
     
+    # All changes go to one in-memory state; the file is written once per pass
+    owns_state = state is None
+    if owns_state:
+        state = SimulationState.load(STATE_FILE)
+    state_by_acid = state.by_acid
+
+    def try_update(acid, new_altitude=None, new_speed=None):
+        """Apply a move unless the evaluator says it creates new conflicts."""
+        if evaluator is not None and evaluator.creates_conflicts(acid, altitude=new_altitude, speed=new_speed):
+            return False
+        update_plane(acid, new_altitude=new_altitude, new_speed=new_speed, state=state)
+        return True
+    
     # Sort conflicts by the total "changes" count of involved planes (prioritize conflicts with less-modified planes)
     # This helps resolve simpler conflicts first and avoid oscillation
-    state = load_state()
-    state_by_acid = {plane["ACID"]: plane for plane in state}
     
     def conflict_priority(conflict_group):
         acids = conflict_group[:-1] if len(conflict_group) > 1 else conflict_group
@@ -98,12 +116,6 @@ def conflict_resolver(conflicts):
         if not acids:
             continue
         
-        # Load current state (reload for each conflict to get latest changes)
-        state = load_state()  # list of dicts
-        
-        # Build ACID lookup dictionary for fast access
-        state_by_acid = {plane["ACID"]: plane for plane in state}
-        
         # Filter out ACIDs that don't exist in state
         valid_acids = [acid for acid in acids if acid in state_by_acid]
         if not valid_acids:
@@ -147,8 +159,7 @@ def conflict_resolver(conflicts):
                 current_alt = plane["altitude"]
                 
                 # Try moving down (since all are at same altitude, moving one down will help)
-                if current_alt - 1000 >= min_alt:
-                    update_plane(acid, new_altitude=current_alt - 1000)
+                if current_alt - 1000 >= min_alt and try_update(acid, new_altitude=current_alt - 1000):
                     conflict_resolved = True
                     break
         
@@ -222,8 +233,7 @@ def conflict_resolver(conflicts):
                                 proposed_alt = current_alt + 1000
                     
                     # Apply altitude change if valid
-                    if proposed_alt is not None:
-                        update_plane(acid, new_altitude=proposed_alt)
+                    if proposed_alt is not None and try_update(acid, new_altitude=proposed_alt):
                         adjustments_made.append(acid)
                         conflict_resolved = True
                         
@@ -243,13 +253,13 @@ def conflict_resolver(conflicts):
                                     
                                     # If we moved highest up, try moving lowest down
                                     if acid == highest_acid:
-                                        if other_current_alt - 1000 >= other_min_alt:
-                                            update_plane(other_acid, new_altitude=other_current_alt - 1000)
+                                        if (other_current_alt - 1000 >= other_min_alt
+                                                and try_update(other_acid, new_altitude=other_current_alt - 1000)):
                                             adjustments_made.append(other_acid)
                                     # If we moved lowest down, try moving highest up
                                     elif acid == lowest_acid:
-                                        if other_current_alt + 1000 <= other_max_alt:
-                                            update_plane(other_acid, new_altitude=other_current_alt + 1000)
+                                        if (other_current_alt + 1000 <= other_max_alt
+                                                and try_update(other_acid, new_altitude=other_current_alt + 1000)):
                                             adjustments_made.append(other_acid)
                         
                         # Break after making adjustments (we've resolved this conflict)
@@ -257,10 +267,6 @@ def conflict_resolver(conflicts):
         
         # If no altitude adjustment was possible, attempt speed adjustments
         if not conflict_resolved:
-            # Reload state to get latest data
-            state = load_state()
-            state_by_acid = {plane["ACID"]: plane for plane in state}
-            
             for acid in sorted_planes:
                 plane = state_by_acid[acid]
                 plane_type = plane.get("Plane type")
@@ -275,13 +281,14 @@ def conflict_resolver(conflicts):
                 current_speed = plane["aircraft speed"]
                 
                 # Try increasing speed by 20 knots if within max
-                if current_speed + 20 <= max_speed:
-                    update_plane(acid, new_speed=current_speed + 20)
+                if current_speed + 20 <= max_speed and try_update(acid, new_speed=current_speed + 20):
                     conflict_resolved = True
                     break
                 
                 # Otherwise, try decreasing speed by 20 knots if within min
-                elif current_speed - 20 >= min_speed:
-                    update_plane(acid, new_speed=current_speed - 20)
+                elif current_speed - 20 >= min_speed and try_update(acid, new_speed=current_speed - 20):
                     conflict_resolved = True
                     break
+
+    if owns_state:
+        state.flush()
@@ -0,0 +1,157 @@
+"""
+Flight-level lookahead for a flight that is not in the schedule yet.
+
+Filing a new flight used to mean editing flights.json, regenerating
+simulation_state.json and re-running the whole pipeline. InsertionAdvisor
+keeps every scheduled flight's sampled positions (via IncrementalDetector)
+and checks only the new flight against traffic airborne at the same time.
+
+Altitude is constant over a flight, so for each candidate speed one
+horizontal sweep finds the flights that come within 5 NM of the new one;
+every flight level in the type's plane_info.json envelope is then checked
+against those flights' altitudes without sampling anything again.
+"""
+
+import math
+import time
+
+from ConflictFinder import VERTICAL_SEPARATION_FT
+from ConflictResolver import load_aircraft_types
+from FlightPath import Trajectory, compile_flights
+from GlobalResolver import candidate_levels, candidate_speeds
+from IncrementalDetector import IncrementalDetector
+from WaypointIndex import build_waypoint_to_acids, parse_route_tokens
+
+REQUIRED_FIELDS = ("ACID", "Plane type", "route", "altitude", "departure airport",
+                   "arrival airport", "departure time", "aircraft speed")
+TEXT_FIELDS = ("ACID", "Plane type", "route", "departure airport", "arrival airport")
+NUMBER_FIELDS = ("altitude", "departure time", "aircraft speed")
+
+
+def is_number(value):
+    """True for a finite int or float (bools are not numbers here)."""
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+class InsertionAdvisor:
+    """Answers "where can this new flight go?" against the traffic in a SimulationState."""
+
+    def __init__(self, state, ping_int=1, trajectories=None, aircraft_types=None):
+        self.state = state
+        self.aircraft_types = aircraft_types if aircraft_types is not None else load_aircraft_types()
+        self.waypoints = build_waypoint_to_acids(state.planes)
+        self.detector = IncrementalDetector(ping_int, waypoints=self.waypoints)
+        if trajectories is None:
+            trajectories = compile_flights(state.planes)
+        self.detector.load(state.planes, trajectories)
+        self.revision = state.revision
+
+    def sync(self):
+        """Pick up planes changed in the state since the last sync. Returns their ACIDs."""
+        changed = self.state.changed_since(self.revision)
+        for acid in changed:
+            self.detector.replace_flight(Trajectory(self.state.get(acid)))
+        self.revision = self.state.revision
+        return changed
+
+    def _compile(self, flight):
+        missing = [field for field in REQUIRED_FIELDS if flight.get(field) is None]
+        if missing:
+            raise ValueError(f"flight plan is missing {', '.join(missing)}")
+        for field in TEXT_FIELDS:
+            if not isinstance(flight[field], str):
+                raise ValueError(f"{field} must be a string")
+        for field in NUMBER_FIELDS:
+            if not is_number(flight[field]):
+                raise ValueError(f"{field} must be a finite number")
+        if not isinstance(flight["departure time"], int):
+            raise ValueError("departure time must be a whole number of seconds (Unix time)")
+        if flight["aircraft speed"] <= 0:
+            raise ValueError("aircraft speed must be positive")
+        if flight["altitude"] < 0:
+            raise ValueError("altitude must not be negative")
+        # The detector's copy of the schedule as of the last sync, so a sync=False
+        # call never reads the state another thread may be changing
+        if flight["ACID"] in self.detector.trajectories:
+            raise ValueError(f"{flight['ACID']} is already scheduled")
+        if flight["Plane type"] not in self.aircraft_types:
+            raise ValueError(f"unknown plane type {flight['Plane type']!r}")
+        try:
+            return Trajectory(flight)
+        except (KeyError, ValueError, IndexError) as e:
+            raise ValueError(f"cannot build a path for route {flight['route']!r}: {e}")
+
+    def _route_neighbours(self, flight):
+        neighbours = set()
+        for wp in parse_route_tokens(flight["route"]):
+            neighbours.update(self.waypoints.get(wp, ()))
+        return neighbours
+
+    def _vertical_conflicts(self, altitude, horizontal):
+        """The subset of horizontal {ACID: [ticks]} that is also within 2000 ft at altitude."""
+        trajectories = self.detector.trajectories
+        return {other: ticks for other, ticks in horizontal.items()
+                if abs(trajectories[other].altitude - altitude) < VERTICAL_SEPARATION_FT}
+
+    def options(self, flight, sync=True):
+        """
+        Conflict-free altitudes and speeds for a new flight plan; nothing is changed.
+
+        flight: a flights.json entry (altitude and speed are the filed ones).
+        sync: pick up state changes first. With False the state is not read at
+              all: the answer, including the already-scheduled check, is
+              against the traffic as of the last sync, which is safe while
+              another thread is changing the state.
+        Returns:
+            {"acid", "plane_type",
+             "filed":   {"altitude", "speed", "conflict_free",
+                         "conflicts": {ACID: [ticks]} at the filed altitude and speed},
+             "options": [{"speed", "altitudes": [conflict-free levels, nearest the filed
+                          one first]}] for each speed in the type's envelope, filed speed
+                          first, then by smallest change,
+             "elapsed_ms"}
+        Raises ValueError for an incomplete, malformed or unknown flight plan.
+        """
+        start = time.perf_counter()
+        filed = self._compile(flight)
+        if sync:
+            self.sync()
+        constraints = self.aircraft_types[flight["Plane type"]]
+        low_speed, high_speed = constraints["speed"]["min"], constraints["speed"]["max"]
+        route_neighbours = self._route_neighbours(flight)
+
+        levels = candidate_levels(flight["altitude"], constraints)
+        speeds = candidate_speeds(flight["aircraft speed"], constraints)
+        if low_speed <= flight["aircraft speed"] <= high_speed:
+            speeds.insert(0, flight["aircraft speed"])
+
+        filed_horizontal = self.detector.new_flight_conflicts(filed, route_neighbours,
+                                                              horizontal_only=True)
+        filed_conflicts = self._vertical_conflicts(flight["altitude"], filed_horizontal)
+
+        options = []
+        for speed in speeds:
+            if speed == flight["aircraft speed"]:
+                horizontal = filed_horizontal
+            else:
+                # A new speed moves the flight in time, so its neighbours change
+                horizontal = self.detector.new_flight_conflicts(
+                    Trajectory(dict(flight, **{"aircraft speed": speed})), route_neighbours,
+                    horizontal_only=True)
+            options.append({
+                "speed": speed,
+                "altitudes": [alt for alt in levels if not self._vertical_conflicts(alt, horizontal)],
+            })
+
+        return {
+            "acid": flight["ACID"],
+            "plane_type": flight["Plane type"],
+            "filed": {
+                "altitude": flight["altitude"],
+                "speed": flight["aircraft speed"],
+                "conflict_free": not filed_conflicts,
+                "conflicts": filed_conflicts,
+            },
+            "options": options,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+        }
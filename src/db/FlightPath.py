@@ -1,9 +1,21 @@
 from datetime import datetime, timedelta, timezone
-from ConflictFinder import detect_conflicts_by_waypoints
+from ConflictFinder import detect_conflicts_by_waypoints, WaypointCandidates
 from main import generate_simulation_state
 from ConflictResolver import conflict_resolver
+from SnapshotEngine import simulate_grid, iter_grid_snapshots
+from ClosestApproach import detect_conflicts_cpa, events_to_conflicts
+from IntervalIndex import IntervalIndex
+from ConflictEvents import aggregate_conflict_events, dedupe_events, events_to_conflict_list
+from WaypointIndex import build_waypoint_to_acids
+from SnapshotStream import open_snapshot_file, tee_snapshots, write_snapshots
+from Instrumentation import metrics
+from ResultCache import ResultCache, flights_key
 import json
 import math
+import os
+import time
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
 
 # Airport coordinates (deg)
 airports = {
@@ -68,6 +80,7 @@ def get_flight_path(flight: dict):
         leg_dist = haversine_nm(*path[i], *path[i+1])
         leg_distances.append(leg_dist)
         total_distance_nm += leg_dist
+    metrics.count("haversine_calls", len(leg_distances))
     
     return path, leg_distances, total_distance_nm
 
@@ -90,114 +103,312 @@ def estimate_arrival(flight: dict):
         "arrival_est": arr_est
     }
 
-def get_position_at_time(flight: dict, minutes_since_dep: float):
-    """Position minutes after departure (assumes already airborne)."""
-    path, leg_distances, total_distance_nm = get_flight_path(flight)
-    
-    speed = flight["aircraft speed"]
-    total_minutes = (total_distance_nm / speed) * 60
-    
-    if minutes_since_dep >= total_minutes:
-        return None  # Arrived - no position to track
-    
-    distance_traveled_nm = (minutes_since_dep / 60) * speed
-    
-    cum_dist = 0.0
-    for leg_idx, leg_dist in enumerate(leg_distances):
-        if distance_traveled_nm <= (cum_dist + leg_dist):
-            fraction = (distance_traveled_nm - cum_dist) / leg_dist
-            start_pt = path[leg_idx]
-            end_pt = path[leg_idx + 1]
-            return great_circle_interpolate(*start_pt, *end_pt, fraction)
-        cum_dist += leg_dist
-    
-    return None  # Shouldn't reach here
+def last_airborne_unix(departure_unix: int, total_minutes: float) -> int:
+    """Last second at which the simulator still reports a flight.
+
+    A flight is airborne at t while int((t - departure) / 60) < total_minutes,
+    i.e. up to (not including) departure + ceil(total_minutes) whole minutes.
+    This can be up to a minute after arrival_unix, which truncates to the second.
+    """
+    return departure_unix + math.ceil(total_minutes) * 60 - 1
+
+class Trajectory:
+    """Compiled flight path: parsed points and leg distances, built once per flight.
+
+    arrival_unix is the scheduled arrival (it sets where the simulation ends);
+    last_airborne_unix is the last second the flight appears in a snapshot.
+    """
+    __slots__ = ("acid", "path", "leg_distances", "cum_distances", "total_distance_nm",
+                 "speed", "altitude", "total_minutes", "departure_unix", "arrival_unix",
+                 "last_airborne_unix")
+
+    def __init__(self, flight: dict):
+        path, leg_distances, total_distance_nm = get_flight_path(flight)
+        self.acid = flight["ACID"]
+        self.path = path
+        self.leg_distances = leg_distances
+        self.total_distance_nm = total_distance_nm
+        self.speed = flight["aircraft speed"]
+        self.altitude = flight.get("altitude", 35000)
+        self.total_minutes = (total_distance_nm / self.speed) * 60
+        self.departure_unix = flight["departure time"]
+        self.arrival_unix = self.departure_unix + int(self.total_minutes * 60)
+        self.last_airborne_unix = last_airborne_unix(self.departure_unix, self.total_minutes)
+
+        # Cumulative distance at the END of each leg (same summation order as
+        # get_position_at_time used to do on every call)
+        cum_distances = []
+        cum_dist = 0.0
+        for leg_dist in leg_distances:
+            cum_dist += leg_dist
+            cum_distances.append(cum_dist)
+        self.cum_distances = cum_distances
+        metrics.count("trajectories_compiled")
+
+    def position_at(self, minutes_since_dep: float):
+        """Position minutes after departure, or None once arrived."""
+        if minutes_since_dep >= self.total_minutes:
+            return None  # Arrived - no position to track
+
+        distance_traveled_nm = (minutes_since_dep / 60) * self.speed
+
+        leg_idx = bisect_left(self.cum_distances, distance_traveled_nm)
+        if leg_idx >= len(self.leg_distances):
+            return None  # Shouldn't reach here
+
+        cum_dist = self.cum_distances[leg_idx - 1] if leg_idx > 0 else 0.0
+        fraction = (distance_traveled_nm - cum_dist) / self.leg_distances[leg_idx]
+        start_pt = self.path[leg_idx]
+        end_pt = self.path[leg_idx + 1]
+        return great_circle_interpolate(*start_pt, *end_pt, fraction)
+
+
+def compile_flights(flights):
+    """Build a Trajectory for every flight (same order as the input list)."""
+    return [Trajectory(flight) for flight in flights]
+
+def get_position_at_time(flight: dict, minutes_since_dep: float, trajectory: Trajectory = None):
+    """Position minutes after departure (assumes already airborne).
+
+    Pass a precompiled trajectory to skip re-parsing the route.
+    """
+    if trajectory is None:
+        trajectory = Trajectory(flight)
+    return trajectory.position_at(minutes_since_dep)
 
 def load_flights(filename: str):
     """Load flights from JSON file."""
-    with open(filename, 'r') as f:
+    with metrics.stage("load_flights"), open(filename, 'r') as f:
+        metrics.count("bytes_read", os.fstat(f.fileno()).st_size)
         return json.load(f)
 
-def simulate_all_flights(filename: str, ping_int: int):
-    """Simulate ONLY airborne flights until last arrival."""
-    flights = load_flights(filename)
+def simulation_ticks(flights, ping_int: int, trajectories=None):
+    """Unix time of every simulation tick: first departure to last arrival, every ping_int minutes."""
+    if not flights:
+        return []
+    if trajectories is None:
+        trajectories = compile_flights(flights)
+    first_dep_unix = flights[0]["departure time"]
+    max_arrival_unix = max(traj.arrival_unix for traj in trajectories)
+    return list(range(first_dep_unix, max_arrival_unix + 1, ping_int * 60))
 
-    snapshots = []
-    
+def iter_snapshots(flights, ping_int: int, backend: str = "python", trajectories=None,
+                   tick_range=None):
+    """Yield airborne-flight snapshots one tick at a time (no printing).
+
+    Same snapshots as simulate_flights, but only the current tick is held in
+    memory, so detection or a snapshot file writer can consume a full day in
+    constant memory.
+    """
     if not flights:
-        print("No flights found in JSON.")
         return
-    
+
+    # Parse routes and leg distances once, not on every tick
+    if trajectories is None:
+        trajectories = compile_flights(flights)
+
     # NEW: Compute max arrival time for sim_end
-    max_arrival_unix = 0
-    for flight in flights:
-        path, _, total_nm = get_flight_path(flight)
-        speed = flight["aircraft speed"]
-        total_hours = total_nm / speed
-        total_minutes = total_hours * 60
-        dep_unix = flight["departure time"]
-        arrival_unix = dep_unix + int(total_minutes * 60)  # seconds
-        if arrival_unix > max_arrival_unix:
-            max_arrival_unix = arrival_unix
+    max_arrival_unix = max(traj.arrival_unix for traj in trajectories)
     
     first_dep_unix = flights[0]["departure time"]
-    sim_start = unix_to_est_24h(first_dep_unix)
-    sim_end = unix_to_est_24h(max_arrival_unix)
+
+    if backend == "numpy":
+        # The grid itself is a few float arrays; only the per-tick dicts are built lazily.
+        # A time shard computes just its own rows, not the whole day.
+        grid = simulate_grid(trajectories, first_dep_unix, max_arrival_unix, ping_int,
+                             tick_range=tick_range)
+        yield from iter_grid_snapshots(grid, trajectories)
+        return
     
-    print(" ")
-    print(f"=== AIRBORNE Flight Simulation ({len(flights)} flights) ===")
-    print(f"Period: {sim_start.strftime('%Y-%m-%d %H:%M')} to {sim_end.strftime('%Y-%m-%d %H:%M')} EST")
-    print(f"Ping: {ping_int}min | Ends when last flight lands")
-    print("-" * 80)
+    # Only flights whose [departure, arrival] window contains the tick are visited
+    tick_times = simulation_ticks(flights, ping_int, trajectories)
+    if tick_range is not None:
+        tick_times = tick_times[tick_range[0]:tick_range[1]]
+    index = IntervalIndex.from_trajectories(trajectories, key=lambda idx, traj: idx)
     
-    current_time = sim_start
-    while current_time <= sim_end:
-        minutes_since_start = int((current_time - sim_start).total_seconds() / 60)
-        # print(f"\n{current_time.strftime('%H:%M')} ({minutes_since_start}m):")
+    for current_unix, active in index.sweep(tick_times):
+        minutes_since_start = (current_unix - first_dep_unix) // 60
+        # print(f"\n{unix_to_est_24h(current_unix).strftime('%H:%M')} ({minutes_since_start}m):")
         
         planes = []
-        airborne_count = 0
-        for flight in flights:
-            dep_time = unix_to_est_24h(flight["departure time"])
-            minutes_since_dep = int((current_time - dep_time).total_seconds() / 60)
+        for flight_idx in sorted(active):
+            traj = trajectories[flight_idx]
+            minutes_since_dep = int((current_unix - traj.departure_unix) / 60)
             
             if minutes_since_dep <= 0:
                 continue
             
-            path, _, total_nm = get_flight_path(flight)
-            speed = flight["aircraft speed"]
-            total_flight_min = (total_nm / speed) * 60
-            
-            if minutes_since_dep < total_flight_min:
-                pos = get_position_at_time(flight, minutes_since_dep)
+            if minutes_since_dep < traj.total_minutes:
+                pos = traj.position_at(minutes_since_dep)
                 if pos:
-                    alt = flight.get("altitude", 35000)
                     planes.append({
-                        "ACID": flight['ACID'],
+                        "ACID": traj.acid,
                         "lat": pos[0],
                         "lon": pos[1],
-                        "alt": alt
+                        "alt": traj.altitude
                     })
-                    # print(f"  {flight['ACID']:>6} {pos[0]:6.2f}N/{abs(pos[1]):7.3f}W "
-                    #     f"{alt:>6}ft (dep+{minutes_since_dep}m)")
-                    airborne_count += 1
-
-        # NEW: Save snapshot and call your function
-        timestamp = minutes_since_start
-        snapshots.append({
-            "timestamp": timestamp,
+                    # print(f"  {traj.acid:>6} {pos[0]:6.2f}N/{abs(pos[1]):7.3f}W "
+                    #     f"{traj.altitude:>6}ft (dep+{minutes_since_dep}m)")
+
+        yield {
+            "timestamp": minutes_since_start,
             "planes": planes
-        })
-        
-        # if airborne_count == 0:
-        #     print("  No airborne flights") 
-        # else:
-        #     print(f"  ({airborne_count} airborne)")
-        
-        current_time += timedelta(minutes=ping_int)
+        }
+
+def simulate_flights(flights, ping_int: int, backend: str = "python", trajectories=None,
+                     tick_range=None):
+    """Simulate ONLY airborne flights for an in-memory flight list (no printing).
 
-    return snapshots  # NEW: Return for external use
+    trajectories: optional precompiled trajectories (same order as flights).
+    tick_range: optional (start, stop) slice of simulation_ticks() to simulate.
+    backend="numpy" computes the whole time grid in batched array operations
+    (requires numpy) and returns the same snapshots.
+    Returns the full list; use iter_snapshots() to stream instead.
+    """
+    return list(iter_snapshots(flights, ping_int, backend=backend, trajectories=trajectories,
+                               tick_range=tick_range))
 
+def simulate_all_flights(filename: str, ping_int: int, backend: str = "python", stream: bool = False):
+    """Simulate ONLY airborne flights until last arrival.
+
+    backend="numpy" computes the whole time grid in batched array operations
+    (requires numpy) and returns the same snapshots.
+    stream=True returns a generator of snapshots instead of a list.
+    """
+    flights = load_flights(filename)
+    
+    if not flights:
+        print("No flights found in JSON.")
+        return
+    
+    trajectories = compile_flights(flights)
+    sim_start = unix_to_est_24h(flights[0]["departure time"])
+    sim_end = unix_to_est_24h(max(traj.arrival_unix for traj in trajectories))
+    
+    print(" ")
+    print(f"=== AIRBORNE Flight Simulation ({len(flights)} flights) ===")
+    print(f"Period: {sim_start.strftime('%Y-%m-%d %H:%M')} to {sim_end.strftime('%Y-%m-%d %H:%M')} EST")
+    print(f"Ping: {ping_int}min | Ends when last flight lands")
+    print("-" * 80)
+
+    if stream:
+        return iter_snapshots(flights, ping_int, backend=backend, trajectories=trajectories)
+    return simulate_flights(flights, ping_int, backend=backend, trajectories=trajectories)
+
+# -------------------- Time-sharded parallel detection -------------------- #
+
+_worker_flights = None
+_worker_trajectories = None
+_worker_candidates = None
+
+def _init_detect_worker(flights):
+    """Process-pool initializer: each worker compiles its own trajectories once."""
+    global _worker_flights, _worker_trajectories, _worker_candidates
+    _worker_flights = flights
+    _worker_trajectories = compile_flights(flights)
+    _worker_candidates = WaypointCandidates(build_waypoint_to_acids(flights))
+
+def _detect_shard(args):
+    """Simulate and detect one contiguous range of ticks inside a worker."""
+    ping_int, backend, tick_range = args
+    conflicts = []
+    snapshots = iter_snapshots(_worker_flights, ping_int, backend=backend,
+                               trajectories=_worker_trajectories, tick_range=tick_range)
+    for snapshot in snapshots:
+        conflicts.extend(detect_conflicts_by_waypoints(snapshot["planes"], snapshot["timestamp"],
+                                                       _worker_candidates))
+    return conflicts
+
+def detect_conflicts_parallel(flights, ping_int: int = 1, workers: int = 2, backend: str = "python",
+                              trajectories=None):
+    """
+    Split the simulation window into time shards and detect them in a process pool.
+
+    Shards are merged back in time order, so the result is the same list
+    detect_conflicts() returns sequentially.
+    """
+    n_ticks = len(simulation_ticks(flights, ping_int, trajectories))
+    # A few shards per worker keeps the pool busy when traffic is uneven over the day
+    n_shards = max(1, min(n_ticks, workers * 4))
+    bounds = [n_ticks * i // n_shards for i in range(n_shards + 1)]
+    shards = [(ping_int, backend, (bounds[i], bounds[i + 1])) for i in range(n_shards)]
+
+    conflicts = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_detect_worker,
+                             initargs=(flights,)) as pool:
+        for shard_conflicts in pool.map(_detect_shard, shards):
+            conflicts.extend(shard_conflicts)
+    return conflicts
+
+def detect_conflicts(flights, ping_int: int = 1, backend: str = "python", use_cpa: bool = False,
+                     trajectories=None, workers: int = 1, cache=None):
+    """
+    Detect conflicts for an in-memory flight list.
+
+    workers > 1 shards sampled detection over time across a process pool.
+    cache: optional ResultCache; the result is keyed on the flights' contents,
+           ping_int, backend, use_cpa and the separation minima, and reused
+           when all of them match.
+    Returns: raw conflicts [ACID1, ACID2, ..., timestamp], one per cluster per
+    tick (or one per pair per CPA event with use_cpa=True), before dedup.
+    """
+    if not flights:
+        return []
+    if cache is not None:
+        key = flights_key(flights, result="raw_conflicts", ping_int=ping_int, backend=backend,
+                          use_cpa=use_cpa)
+        conflicts = cache.get(key)
+        if conflicts is None:
+            conflicts = detect_conflicts(flights, ping_int, backend=backend, use_cpa=use_cpa,
+                                         trajectories=trajectories, workers=workers)
+            cache.put(key, conflicts)
+        return conflicts
+    if workers > 1 and not use_cpa:
+        with metrics.stage("parallel_detection"):
+            return detect_conflicts_parallel(flights, ping_int, workers=workers, backend=backend,
+                                             trajectories=trajectories)
+    if trajectories is None:
+        with metrics.stage("compile"):
+            trajectories = compile_flights(flights)
+
+    if use_cpa:
+        # Analytic per-leg-pair detection: no sampling, catches fast crossings between pings
+        with metrics.stage("cpa_detection"):
+            events = detect_conflicts_cpa(trajectories, flights[0]["departure time"])
+            return events_to_conflicts(events)
+
+    # Waypoint index built from these flights and compiled once per run
+    candidates = WaypointCandidates(build_waypoint_to_acids(flights))
+    conflicts = []
+    # Simulation (next snapshot) and detection are timed separately per tick
+    simulation_s = detection_s = 0.0
+    ticks = plane_ticks = 0
+    snapshots = iter_snapshots(flights, ping_int, backend=backend, trajectories=trajectories)
+    while True:
+        start = time.perf_counter()
+        snapshot = next(snapshots, None)
+        simulation_s += time.perf_counter() - start
+        if snapshot is None:
+            break
+        ticks += 1
+        plane_ticks += len(snapshot["planes"])
+        start = time.perf_counter()
+        conflicts.extend(detect_conflicts_by_waypoints(snapshot["planes"], snapshot["timestamp"],
+                                                       candidates))
+        detection_s += time.perf_counter() - start
+    metrics.add_time("simulation", simulation_s, ticks)
+    metrics.add_time("detection", detection_s, ticks)
+    metrics.count("ticks", ticks)
+    metrics.count("plane_ticks", plane_ticks)
+    return conflicts
+
+def dedupe_conflict_events(conflicts, ping_int: int = 1):
+    """Merge repeated ticks into events (with duration) and drop subset clusters."""
+    return dedupe_events(aggregate_conflict_events(conflicts, ping_int))
+
+def dedupe_conflicts(conflicts, ping_int: int = 1):
+    """Keep the largest clusters; drop any cluster that is a subset of one already kept."""
+    return events_to_conflict_list(dedupe_conflict_events(conflicts, ping_int))
 
 if __name__ == "__main__":
     import sys
@@ -205,6 +416,16 @@ if __name__ == "__main__":
     # Check if user wants to skip reset (for iterative resolution)
     # Usage: python FlightPath.py --no-reset
     skip_reset = '--no-reset' in sys.argv or '--iterative' in sys.argv
+    # Usage: python FlightPath.py --numpy  (vectorized snapshot engine, needs numpy)
+    backend = "numpy" if '--numpy' in sys.argv else "python"
+    # Usage: python FlightPath.py --cpa  (continuous closest-point-of-approach detection)
+    use_cpa = '--cpa' in sys.argv
+    # Usage: python FlightPath.py --workers 8  (time-sharded detection across processes)
+    workers = int(sys.argv[sys.argv.index('--workers') + 1]) if '--workers' in sys.argv else 1
+    # Usage: python FlightPath.py --snapshots-out snapshots.ndjson  (.gz to compress)
+    snapshots_out = sys.argv[sys.argv.index('--snapshots-out') + 1] if '--snapshots-out' in sys.argv else None
+    # Usage: python FlightPath.py --no-cache  (always re-detect, even for a state seen before)
+    cache = ResultCache() if '--no-cache' not in sys.argv else None
     
     if not skip_reset:
         # Generate fresh simulation state from flights.json BEFORE conflict detection
@@ -220,37 +441,45 @@ if __name__ == "__main__":
     # simulate_all_flights needs flights.json to simulate flight paths
     # It uses simulation_state.json internally for current plane states
     flights_path = 'simulation_state.json'
-    snapshots = simulate_all_flights(flights_path, 1)
-
-    conflicts = []
 
-    for snapshot in snapshots:
-        # print(snapshot)
-        sp_conflicts = detect_conflicts_by_waypoints(snapshot["planes"], snapshot["timestamp"])
+    if use_cpa or workers > 1 or (cache is not None and not snapshots_out):
+        flights = load_flights(flights_path)
+        conflicts = detect_conflicts(flights, 1, backend=backend, use_cpa=use_cpa, workers=workers,
+                                     cache=cache)
+        if snapshots_out:
+            count = write_snapshots(iter_snapshots(flights, 1, backend=backend), snapshots_out)
+            print(f"Wrote {count} snapshots to {snapshots_out}")
+    else:
+        # Snapshots are streamed: detection (and the optional snapshot file) sees one tick at a time
+        snapshots = simulate_all_flights(flights_path, 1, backend=backend, stream=True)
+        snapshot_file = open_snapshot_file(snapshots_out) if snapshots_out else None
+        if snapshot_file is not None:
+            snapshots = tee_snapshots(snapshots, snapshot_file)
 
-        conflicts.extend(sp_conflicts)
+        conflicts = []
 
-    unique_conflicts = []
-    seen_clusters = set()
-    conflicts.sort(key=lambda c: -len(c[:-1]))
-    print('')
+        try:
+            for snapshot in snapshots:
+                # print(snapshot)
+                sp_conflicts = detect_conflicts_by_waypoints(snapshot["planes"], snapshot["timestamp"])
 
-    for conflict in conflicts:
-        # Extract plane names (ignore timestamp)
-        planes_set = frozenset(conflict[:-1])
-    
-        # Skip if subset of any existing
-        is_subset = any(planes_set.issubset(existing) for existing in seen_clusters)
-        
-        if not is_subset:
-            seen_clusters.add(planes_set)
-            unique_conflicts.append(conflict)
+                conflicts.extend(sp_conflicts)
+        finally:
+            if snapshot_file is not None:
+                snapshot_file.close()
+                print(f"Wrote snapshots to {snapshots_out}")
 
-    conflicts = unique_conflicts  # Replace with deduplicated list
+    print('')
+    events = dedupe_conflict_events(conflicts)
+    conflicts = events_to_conflict_list(events)  # Replace with deduplicated list
 
     with open('conflicts.json', 'w') as f:
         json.dump(conflicts, f, indent=2)
 
+    # Same conflicts with start/end/duration (minutes) for the dashboard
+    with open('conflict_events.json', 'w') as f:
+        json.dump(events, f, indent=2)
+
     print(conflicts)
     print(f"\nTotal conflicts detected: {len(conflicts)}")
     
@@ -0,0 +1,241 @@
+"""
+Compact columnar flight store.
+
+Instead of one dict per plane with long string keys, every field is one
+column: numbers in typed arrays, repeated strings (plane type, airports,
+routes) interned once and stored as small integer ids, and each ACID mapped
+to its row number. FlightRow is a two-slot view over one row that still
+answers flight["aircraft speed"] / flight.get("altitude"), so the simulator,
+detector and resolver can take a FlightTable wherever they take a list of
+flight dicts.
+"""
+
+import json
+import sys
+from array import array
+
+MISSING = -1  # Sentinel for optional integer fields (altitude, changes)
+_ABSENT = object()
+
+# JSON key -> column name; fields a row didn't have are written back out in this order
+FIELDS = {
+    "ACID": "acid",
+    "Plane type": "plane_type",
+    "route": "route",
+    "altitude": "altitude",
+    "departure airport": "departure_airport",
+    "arrival airport": "arrival_airport",
+    "departure time": "departure_time",
+    "aircraft speed": "speed",
+    "passengers": "passengers",
+    "is_cargo": "is_cargo",
+    "changes": "changes",
+}
+
+# Fields the resolver may change in place
+MUTABLE_FIELDS = ("altitude", "aircraft speed", "changes")
+
+
+class StringPool:
+    """Interned strings <-> small integer ids."""
+
+    __slots__ = ("strings", "ids")
+
+    def __init__(self):
+        self.strings = []
+        self.ids = {}
+
+    def id_of(self, value):
+        string_id = self.ids.get(value)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.strings.append(sys.intern(value))
+            self.ids[value] = string_id
+        return string_id
+
+    def __getitem__(self, string_id):
+        return self.strings[string_id]
+
+
+class FlightTable:
+    """Struct-of-arrays flight list; row i is flight i in file order."""
+
+    __slots__ = ("acids", "ids", "plane_types", "airports", "routes",
+                 "plane_type", "route", "departure_airport", "arrival_airport",
+                 "departure_time", "speed", "altitude", "passengers", "is_cargo",
+                 "changes", "extras", "key_orders", "key_order_ids", "key_order")
+
+    def __init__(self):
+        self.acids = []            # row -> interned ACID
+        self.ids = {}              # ACID -> row
+        self.plane_types = StringPool()
+        self.airports = StringPool()
+        self.routes = StringPool()
+        self.plane_type = array("H")
+        self.route = array("I")
+        self.departure_airport = array("H")
+        self.arrival_airport = array("H")
+        self.departure_time = array("q")
+        self.speed = array("d")
+        self.altitude = array("i")
+        self.passengers = array("i")
+        self.is_cargo = array("b")
+        self.changes = array("i")
+        self.extras = {}           # row -> {key: value} for keys not in FIELDS
+        self.key_orders = []       # distinct key orders seen in the source dicts
+        self.key_order_ids = {}    # key order tuple -> index in key_orders
+        self.key_order = array("H")  # row -> index in key_orders
+
+    @classmethod
+    def from_flights(cls, flights):
+        table = cls()
+        for flight in flights:
+            table.append(flight)
+        return table
+
+    @classmethod
+    def load(cls, path):
+        """Load flights.json or simulation_state.json."""
+        with open(path, "r") as f:
+            return cls.from_flights(json.load(f))
+
+    def append(self, flight):
+        row = len(self.acids)
+        acid = sys.intern(flight["ACID"])
+        self.acids.append(acid)
+        self.ids[acid] = row
+        self.plane_type.append(self.plane_types.id_of(flight["Plane type"]))
+        self.route.append(self.routes.id_of(flight["route"]))
+        self.departure_airport.append(self.airports.id_of(flight["departure airport"]))
+        self.arrival_airport.append(self.airports.id_of(flight["arrival airport"]))
+        self.departure_time.append(flight["departure time"])
+        self.speed.append(flight["aircraft speed"])
+        self.altitude.append(flight.get("altitude", MISSING))
+        self.passengers.append(flight.get("passengers", 0))
+        self.is_cargo.append(bool(flight.get("is_cargo", False)))
+        self.changes.append(flight.get("changes", MISSING))
+        extra = {key: value for key, value in flight.items() if key not in FIELDS}
+        if extra:
+            self.extras[row] = extra
+        keys = tuple(flight.keys())
+        order_id = self.key_order_ids.get(keys)
+        if order_id is None:
+            order_id = self.key_order_ids[keys] = len(self.key_orders)
+            self.key_orders.append(keys)
+        self.key_order.append(order_id)
+        return row
+
+    def __len__(self):
+        return len(self.acids)
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self.acids)
+        if not 0 <= row < len(self.acids):
+            raise IndexError("flight row out of range")
+        return FlightRow(self, row)
+
+    def __iter__(self):
+        for row in range(len(self.acids)):
+            yield FlightRow(self, row)
+
+    def __contains__(self, acid):
+        return acid in self.ids
+
+    def row_of(self, acid):
+        """Row number for an ACID, or None."""
+        return self.ids.get(acid)
+
+    def get(self, acid):
+        """FlightRow for an ACID, or None."""
+        row = self.ids.get(acid)
+        return None if row is None else FlightRow(self, row)
+
+    def to_flight(self, row):
+        """One row as a plain dict with the same keys, in the same order, as the source dict."""
+        values = {
+            "ACID": self.acids[row],
+            "Plane type": self.plane_types[self.plane_type[row]],
+            "route": self.routes[self.route[row]],
+        }
+        if self.altitude[row] != MISSING:
+            values["altitude"] = self.altitude[row]
+        values["departure airport"] = self.airports[self.departure_airport[row]]
+        values["arrival airport"] = self.airports[self.arrival_airport[row]]
+        values["departure time"] = self.departure_time[row]
+        values["aircraft speed"] = self.speed[row]
+        values["passengers"] = self.passengers[row]
+        values["is_cargo"] = bool(self.is_cargo[row])
+        if self.changes[row] != MISSING:
+            values["changes"] = self.changes[row]
+        values.update(self.extras.get(row, {}))
+        flight = {key: values[key] for key in self.key_orders[self.key_order[row]] if key in values}
+        # Fields set after loading (e.g. a first altitude) follow in FIELDS order
+        for key, value in values.items():
+            flight.setdefault(key, value)
+        return flight
+
+    def to_flights(self):
+        """The whole table as a list of dicts (for JSON export)."""
+        return [self.to_flight(row) for row in range(len(self.acids))]
+
+
+class FlightRow:
+    """Dict-like view of one FlightTable row (reads and writes go to the columns)."""
+
+    __slots__ = ("table", "row")
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    @property
+    def acid(self):
+        return self.table.acids[self.row]
+
+    def __getitem__(self, key):
+        table, row = self.table, self.row
+        if key == "ACID":
+            return table.acids[row]
+        if key == "aircraft speed":
+            return table.speed[row]
+        if key == "altitude" or key == "changes":
+            value = getattr(table, key)[row]
+            if value == MISSING:
+                raise KeyError(key)
+            return value
+        if key == "departure time":
+            return table.departure_time[row]
+        if key == "Plane type":
+            return table.plane_types[table.plane_type[row]]
+        if key == "route":
+            return table.routes[table.route[row]]
+        if key == "departure airport":
+            return table.airports[table.departure_airport[row]]
+        if key == "arrival airport":
+            return table.airports[table.arrival_airport[row]]
+        if key == "passengers":
+            return table.passengers[row]
+        if key == "is_cargo":
+            return bool(table.is_cargo[row])
+        return table.extras.get(row, {})[key]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return self.get(key, _ABSENT) is not _ABSENT
+
+    def __setitem__(self, key, value):
+        if key not in MUTABLE_FIELDS:
+            raise KeyError(f"{key!r} is read-only in a FlightTable")
+        getattr(self.table, FIELDS[key])[self.row] = value
+
+    def keys(self):
+        return self.table.to_flight(self.row).keys()
+
+    def to_dict(self):
+        return self.table.to_flight(self.row)
@@ -0,0 +1,215 @@
+"""
+Global conflict resolution: choose flight levels (and, if needed, speeds)
+for all aircraft at once instead of nudging one cluster at a time.
+
+Altitude is constant over a flight, so whether two flights conflict depends
+only on their trajectories coming within 5 NM of each other (horizontal) and
+their altitudes being less than 2000 ft apart. The resolver builds the graph
+of horizontally-close flight pairs once, then treats resolution as colouring
+that graph with flight levels:
+
+1. Keep as many aircraft as possible at their current altitude: repeatedly
+   drop the aircraft involved in the most conflicts until none remain.
+   Aircraft outside their altitude bounds are always dropped.
+2. Re-assign each dropped aircraft, most constrained first, to the free
+   flight level (within its plane_info.json bounds) closest to its current
+   one.
+3. If no level is free, try speed changes within bounds; a new speed moves
+   the flight in time, so its neighbours are recomputed for each candidate.
+"""
+
+from ConflictFinder import VERTICAL_SEPARATION_FT
+from ConflictResolver import load_aircraft_types
+from FlightPath import Trajectory
+from IncrementalDetector import IncrementalDetector
+from WaypointIndex import build_waypoint_to_acids
+
+LEVEL_STEP_FT = 1000
+SPEED_STEP_KT = 20
+
+
+def candidate_levels(current, constraints):
+    """
+    Every flight level within the type's altitude bounds, nearest current first.
+
+    current itself is included only if it is within bounds, so an aircraft
+    filed outside its envelope always gets an in-bounds level.
+    """
+    low, high = constraints["altitude"]["min"], constraints["altitude"]["max"]
+    first = -(-low // LEVEL_STEP_FT) * LEVEL_STEP_FT  # lowest whole flight level >= min
+    levels = set(range(first, high + 1, LEVEL_STEP_FT))
+    if low <= current <= high:
+        levels.add(current)
+    return sorted(levels, key=lambda alt: (abs(alt - current), alt))
+
+
+def candidate_speeds(current, constraints):
+    """Alternative speeds within the type's speed bounds, smallest change first."""
+    low, high = constraints["speed"]["min"], constraints["speed"]["max"]
+    speeds = []
+    step = SPEED_STEP_KT
+    while current - step >= low or current + step <= high:
+        if current + step <= high:
+            speeds.append(current + step)
+        if current - step >= low:
+            speeds.append(current - step)
+        step += SPEED_STEP_KT
+    return speeds
+
+
+class GlobalResolver:
+    """One-pass flight-level assignment over the horizontal conflict graph."""
+
+    def __init__(self, state, ping_int=1, aircraft_types=None, waypoints=None):
+        self.state = state
+        self.ping_int = ping_int
+        self.aircraft_types = aircraft_types if aircraft_types is not None else load_aircraft_types()
+        if waypoints is None:
+            waypoints = build_waypoint_to_acids(state.planes)
+        self.detector = IncrementalDetector(ping_int, waypoints=waypoints)
+        self.graph = {}        # ACID -> set of horizontally-close ACIDs
+        self.altitudes = {}    # ACID -> assigned altitude
+        self.speeds = {}       # ACID -> new speed (only for re-timed flights)
+        self.unresolved = []   # ACIDs left in conflict
+
+    # -------------------- Constraints -------------------- #
+
+    def _constraints(self, plane):
+        return self.aircraft_types.get(plane.get("Plane type"))
+
+    def _levels(self, plane):
+        """Candidate altitudes: every flight level within bounds (see candidate_levels)."""
+        constraints = self._constraints(plane)
+        if constraints is None:
+            return [plane["altitude"]]
+        return candidate_levels(plane["altitude"], constraints)
+
+    def _in_bounds(self, plane):
+        """True if the aircraft's current altitude is allowed for its type (or the type is unknown)."""
+        constraints = self._constraints(plane)
+        if constraints is None:
+            return True
+        return constraints["altitude"]["min"] <= plane["altitude"] <= constraints["altitude"]["max"]
+
+    def _speeds(self, plane):
+        """Alternative speeds within bounds, smallest change first."""
+        constraints = self._constraints(plane)
+        if constraints is None:
+            return []
+        return candidate_speeds(plane["aircraft speed"], constraints)
+
+    def _free_levels(self, acid, plane, neighbours):
+        """Levels that keep vertical separation from every assigned neighbour."""
+        taken = [self.altitudes[other] for other in neighbours if other in self.altitudes]
+        return [level for level in self._levels(plane)
+                if all(abs(level - alt) >= VERTICAL_SEPARATION_FT for alt in taken)]
+
+    # -------------------- Graph -------------------- #
+
+    def build_graph(self, trajectories):
+        """Horizontal conflict graph over all flights (altitude ignored)."""
+        self.detector.load(self.state.planes, trajectories)
+        self.graph = {traj.acid: set() for traj in trajectories}
+        for acid1, acid2 in self.detector.horizontal_pairs():
+            self.graph[acid1].add(acid2)
+            self.graph[acid2].add(acid1)
+        return self.graph
+
+    def _retime(self, acid, traj, neighbours):
+        """Commit a speed change: new trajectory and new graph edges."""
+        for other in self.graph[acid]:
+            self.graph[other].discard(acid)
+        self.graph[acid] = set(neighbours)
+        for other in neighbours:
+            self.graph[other].add(acid)
+        self.detector.replace_flight(traj)
+        self.speeds[acid] = traj.speed
+
+    # -------------------- Assignment -------------------- #
+
+    def _conflicting(self, acid, alt, assigned):
+        return [other for other in self.graph[acid]
+                if other in assigned and abs(assigned[other] - alt) < VERTICAL_SEPARATION_FT]
+
+    def _keep_current(self):
+        """Largest set (greedily) of aircraft that can all stay where they are."""
+        # Aircraft outside their altitude envelope can't stay; they are assigned like the rest
+        dropped = {acid for acid in self.graph if not self._in_bounds(self.state.get(acid))}
+        current = {acid: self.state.get(acid)["altitude"] for acid in self.graph if acid not in dropped}
+        conflicts = {acid: set(self._conflicting(acid, current[acid], current)) for acid in current}
+        while True:
+            worst = max((acid for acid in conflicts if conflicts[acid]),
+                        key=lambda acid: (len(conflicts[acid]), -self.detector.order[acid]),
+                        default=None)
+            if worst is None:
+                break
+            dropped.add(worst)
+            for other in conflicts.pop(worst):
+                conflicts[other].discard(worst)
+        return {acid: current[acid] for acid in current if acid not in dropped}, dropped
+
+    def assign(self):
+        """Assign altitudes (and speeds where needed). Returns the number of aircraft changed."""
+        self.altitudes, pending = self._keep_current()
+        self.speeds = {}
+        self.unresolved = []
+
+        while pending:
+            # Most constrained aircraft first (fewest free levels), then state order
+            options = {acid: self._free_levels(acid, self.state.get(acid), self.graph[acid])
+                       for acid in pending}
+            acid = min(pending, key=lambda a: (len(options[a]), self.detector.order[a]))
+            pending.discard(acid)
+            plane = self.state.get(acid)
+
+            if options[acid]:
+                self.altitudes[acid] = options[acid][0]
+                continue
+
+            if self._assign_with_speed(acid, plane):
+                continue
+
+            # Nothing separates it completely: least-conflicted level, closest first
+            self.altitudes[acid] = min(
+                self._levels(plane),
+                key=lambda alt: len(self._conflicting(acid, alt, self.altitudes)))
+            self.unresolved.append(acid)
+
+        return sum(1 for acid in self.graph if self._changed(acid))
+
+    def _assign_with_speed(self, acid, plane):
+        for speed in self._speeds(plane):
+            retimed = dict(plane)
+            retimed["aircraft speed"] = speed
+            traj = Trajectory(retimed)
+            neighbours = self.detector.horizontal_neighbours(acid, traj)
+            free = self._free_levels(acid, plane, neighbours)
+            if free:
+                self._retime(acid, traj, neighbours)
+                self.altitudes[acid] = free[0]
+                return True
+        return False
+
+    def _changed(self, acid):
+        plane = self.state.get(acid)
+        return self.altitudes[acid] != plane["altitude"] or acid in self.speeds
+
+    def apply(self):
+        """Write the assignment into the state (one update per changed aircraft)."""
+        changed = []
+        for plane in self.state.planes:
+            acid = plane["ACID"]
+            if acid in self.altitudes and self._changed(acid):
+                new_altitude = self.altitudes[acid]
+                self.state.update_plane(
+                    acid,
+                    new_altitude=new_altitude if new_altitude != plane["altitude"] else None,
+                    new_speed=self.speeds.get(acid))
+                changed.append(acid)
+        return changed
+
+    def resolve(self, trajectories):
+        """Build the graph, assign levels/speeds and apply them. Returns the changed ACIDs."""
+        self.build_graph(trajectories)
+        self.assign()
+        return self.apply()
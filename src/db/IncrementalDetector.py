@@ -0,0 +1,348 @@
+"""
+Incremental conflict re-detection for the iterative resolver.
+
+The detector keeps each flight's sampled positions and the set of ticks at
+which every pair of flights loses separation. After the resolver changes a
+handful of aircraft, only pairs involving those aircraft are invalidated and
+recomputed against time-overlapping neighbours; per-tick clusters are then
+rebuilt from the cached pair conflicts.
+
+Clusters follow the same rules as detect_conflicts_by_waypoints (a plane only
+counts at a tick if it shares a waypoint with another airborne plane), so the
+conflict sets per tick match a full re-run. Plane order inside a cluster
+follows the state file order.
+"""
+
+from ConflictFinder import (
+    HORIZONTAL_SEPARATION_NM,
+    VERTICAL_SEPARATION_FT,
+    haversine_distance,
+)
+from Instrumentation import metrics
+from IntervalIndex import IntervalIndex
+
+# Bounding-box margins (deg) used to skip pairs that never get close.
+# 5 NM is ~0.083 deg of latitude; longitude degrees shrink with latitude.
+LAT_MARGIN_DEG = 0.1
+LON_MARGIN_DEG = 0.3
+# Lower bound on NM per degree of latitude (Earth radius 3440 NM gives ~60.04)
+NM_PER_DEG_LAT = 60.0
+# Slack on the per-tick closing distance used to skip far-apart ticks
+CLOSING_SAFETY = 1.05
+
+
+def waypoint_neighbours(waypoints):
+    """ACID -> set of other ACIDs sharing at least one waypoint."""
+    neighbours = {}
+    for acids in waypoints.values():
+        for acid in acids:
+            neighbours.setdefault(acid, set()).update(acids)
+    for acid, others in neighbours.items():
+        others.discard(acid)
+    return neighbours
+
+
+class IncrementalDetector:
+    """
+    Pairwise sampled conflict detection that can be updated per changed flight.
+
+    waypoints: waypoint -> ACIDs index for the flights being checked, e.g.
+    build_waypoint_to_acids(state.planes), the same index a full detection
+    of those flights builds.
+    """
+
+    def __init__(self, ping_int=1, *, waypoints):
+        self.ping_int = ping_int
+        self.neighbours = waypoint_neighbours(waypoints)
+        self.sim_start_unix = None
+        self.order = {}          # ACID -> position in the state file
+        self.trajectories = {}   # ACID -> Trajectory
+        self.positions = {}      # ACID -> {tick: (lat, lon)}
+        self.boxes = {}          # ACID -> (min_lat, max_lat, min_lon, max_lon)
+        self.pair_ticks = {}     # (ACID1, ACID2) -> [ticks in conflict]
+        self.pairs_by_acid = {}  # ACID -> set of pair keys involving it
+        self.index = IntervalIndex()  # ACID -> [departure, last airborne second]
+        self.pair_checks = 0
+
+    # -------------------- Per-flight sampling -------------------- #
+
+    def _sample(self, traj):
+        """Positions at every tick where the simulator would report this flight."""
+        step = self.ping_int * 60
+        first_tick = max(0, (traj.departure_unix - self.sim_start_unix) // step)
+        last_tick = (traj.last_airborne_unix - self.sim_start_unix) // step
+
+        positions = {}
+        for tick in range(first_tick, last_tick + 1):
+            tick_unix = self.sim_start_unix + tick * step
+            minutes_since_dep = int((tick_unix - traj.departure_unix) / 60)
+            if minutes_since_dep <= 0 or minutes_since_dep >= traj.total_minutes:
+                continue
+            pos = traj.position_at(minutes_since_dep)
+            if pos:
+                positions[tick * self.ping_int] = pos
+        return positions
+
+    def _set_flight(self, traj):
+        positions = self._sample(traj)
+        self.trajectories[traj.acid] = traj
+        self.positions[traj.acid] = positions
+        self.index.add(traj.acid, traj.departure_unix, traj.last_airborne_unix)
+        self.boxes[traj.acid] = self._box(positions)
+
+    @staticmethod
+    def _box(positions):
+        if not positions:
+            return None
+        lats = [pos[0] for pos in positions.values()]
+        lons = [pos[1] for pos in positions.values()]
+        return (min(lats), max(lats), min(lons), max(lons))
+
+    # -------------------- Pair checks -------------------- #
+
+    def _pair_key(self, acid1, acid2):
+        return (acid1, acid2) if self.order[acid1] < self.order[acid2] else (acid2, acid1)
+
+    def _check_pair(self, acid1, acid2, horizontal_only=False):
+        """Ticks at which the two flights violate separation minima (or just the horizontal one)."""
+        traj1, traj2 = self.trajectories[acid1], self.trajectories[acid2]
+        if not horizontal_only and abs(traj1.altitude - traj2.altitude) >= VERTICAL_SEPARATION_FT:
+            return []
+        box1, box2 = self.boxes[acid1], self.boxes[acid2]
+        if box1 is None or box2 is None:
+            return []
+        if (box1[0] - LAT_MARGIN_DEG > box2[1] or box2[0] - LAT_MARGIN_DEG > box1[1]
+                or box1[2] - LON_MARGIN_DEG > box2[3] or box2[2] - LON_MARGIN_DEG > box1[3]):
+            return []
+
+        self.pair_checks += 1
+        pos1, pos2 = self.positions[acid1], self.positions[acid2]
+        # Positions are keyed by tick in ascending order; only the shared span matters
+        first = max(next(iter(pos1)), next(iter(pos2)))
+        last = min(next(reversed(pos1)), next(reversed(pos2)))
+
+        # Between two ticks the pair closes by at most the sum of their speeds, so
+        # while they are far apart whole stretches of ticks can be skipped
+        max_closing_nm = (traj1.speed + traj2.speed) / 60 * self.ping_int * CLOSING_SAFETY
+        ticks = []
+        haversine_calls = 0
+        tick = first
+        while tick <= last:
+            p1, p2 = pos1.get(tick), pos2.get(tick)
+            if p1 is None or p2 is None:
+                tick += self.ping_int
+                continue
+            # Latitude gap alone is a lower bound on the distance
+            distance = abs(p1[0] - p2[0]) * NM_PER_DEG_LAT
+            if distance < HORIZONTAL_SEPARATION_NM:
+                distance = haversine_distance(p1[0], p1[1], p2[0], p2[1])
+                haversine_calls += 1
+                if distance < HORIZONTAL_SEPARATION_NM:
+                    ticks.append(tick)
+                    tick += self.ping_int
+                    continue
+            skip = int((distance - HORIZONTAL_SEPARATION_NM) / max_closing_nm) + 1
+            tick += skip * self.ping_int
+        metrics.count("pair_checks")
+        metrics.count("haversine_calls", haversine_calls)
+        return ticks
+
+    def _store_pair(self, acid1, acid2, ticks):
+        key = self._pair_key(acid1, acid2)
+        if ticks:
+            self.pair_ticks[key] = ticks
+            self.pairs_by_acid.setdefault(acid1, set()).add(key)
+            self.pairs_by_acid.setdefault(acid2, set()).add(key)
+
+    def _drop_pairs(self, acid):
+        for key in self.pairs_by_acid.pop(acid, set()):
+            self.pair_ticks.pop(key, None)
+            other = key[1] if key[0] == acid else key[0]
+            other_keys = self.pairs_by_acid.get(other)
+            if other_keys is not None:
+                other_keys.discard(key)
+
+    def _overlapping(self, acid):
+        """Flights whose airborne interval overlaps this flight's."""
+        traj = self.trajectories[acid]
+        return self.index.overlapping(traj.departure_unix, traj.last_airborne_unix, exclude=acid)
+
+    # -------------------- Public API -------------------- #
+
+    def load(self, flights, trajectories):
+        """Sample every flight without checking any pairs yet."""
+        self.sim_start_unix = flights[0]["departure time"]
+        self.order = {traj.acid: idx for idx, traj in enumerate(trajectories)}
+        self.trajectories = {}
+        self.positions = {}
+        self.boxes = {}
+        self.pair_ticks = {}
+        self.pairs_by_acid = {}
+        self.index = IntervalIndex()
+        for traj in trajectories:
+            self._set_flight(traj)
+
+    def full(self, flights, trajectories):
+        """Detect from scratch. Returns raw conflicts [ACID1, ..., timestamp]."""
+        self.load(flights, trajectories)
+
+        # Each time-overlapping pair is checked once
+        for acid1, acid2 in self.index.overlapping_pairs():
+            self._store_pair(acid1, acid2, self._check_pair(acid1, acid2))
+        return self.conflicts()
+
+    def update(self, trajectories_by_acid, changed_acids):
+        """
+        Re-check only pairs involving changed flights.
+
+        trajectories_by_acid: ACID -> freshly compiled Trajectory for each changed flight
+        Returns raw conflicts [ACID1, ..., timestamp] for the whole schedule.
+        """
+        self.recheck(trajectories_by_acid, changed_acids)
+        return self.conflicts()
+
+    def recheck(self, trajectories_by_acid, changed_acids):
+        """Swap in changed flights and re-check their pairs, without rebuilding clusters."""
+        for acid in changed_acids:
+            self._drop_pairs(acid)
+            self._set_flight(trajectories_by_acid[acid])
+
+        done = set()
+        for acid in changed_acids:
+            for other in self._overlapping(acid):
+                key = self._pair_key(acid, other)
+                if key in done:
+                    continue
+                done.add(key)
+                self._store_pair(acid, other, self._check_pair(acid, other))
+
+    def pair_conflicts(self, acid, traj=None, horizontal_only=False):
+        """
+        Other flights this flight loses separation with: {ACID: [ticks]}.
+
+        Only ticks where both flights count for detection (waypoint rule) are
+        kept. traj: optional what-if trajectory for acid; it is used for this
+        call only. If it keeps the same speed and departure (an altitude-only
+        change), the cached positions are reused.
+        horizontal_only: ignore altitude (5 NM horizontal loss at any level).
+        """
+        if traj is not None:
+            saved = (self.trajectories[acid], self.positions[acid], self.boxes[acid])
+            current = saved[0]
+            self.trajectories[acid] = traj
+            if traj.speed != current.speed or traj.departure_unix != current.departure_unix:
+                self.positions[acid] = self._sample(traj)
+                self.boxes[acid] = self._box(self.positions[acid])
+            start, end = traj.departure_unix, traj.last_airborne_unix
+        else:
+            start, end = self.index.interval(acid)
+        try:
+            conflicts = {}
+            for other in self.index.overlapping(start, end, exclude=acid):
+                ticks = [tick for tick in self._check_pair(acid, other, horizontal_only)
+                         if self._eligible(acid, tick) and self._eligible(other, tick)]
+                if ticks:
+                    conflicts[other] = ticks
+            return conflicts
+        finally:
+            if traj is not None:
+                self.trajectories[acid], self.positions[acid], self.boxes[acid] = saved
+
+    def new_flight_conflicts(self, traj, route_neighbours, horizontal_only=False):
+        """
+        Flights a not-yet-scheduled flight would lose separation with: {ACID: [ticks]}.
+
+        Same rules as pair_conflicts. route_neighbours: ACIDs sharing a waypoint
+        with the new flight; once it is airborne they count for detection too.
+        The flight is sampled for this call only and nothing is stored.
+        """
+        acid = traj.acid
+        if acid in self.trajectories:
+            raise ValueError(f"{acid} is already scheduled")
+        route_neighbours = set(route_neighbours)
+        positions = self._sample(traj)
+        self.trajectories[acid] = traj
+        self.positions[acid] = positions
+        self.boxes[acid] = self._box(positions)
+        self.neighbours[acid] = route_neighbours
+        try:
+            conflicts = {}
+            for other in self.index.overlapping(traj.departure_unix, traj.last_airborne_unix):
+                ticks = [tick for tick in self._check_pair(acid, other, horizontal_only)
+                         if self._eligible(acid, tick)
+                         and (other in route_neighbours or self._eligible(other, tick))]
+                if ticks:
+                    conflicts[other] = ticks
+            return conflicts
+        finally:
+            del self.trajectories[acid], self.positions[acid], self.boxes[acid], self.neighbours[acid]
+
+    def horizontal_neighbours(self, acid, traj=None):
+        """
+        ACIDs that lose horizontal separation with this flight at any altitude,
+        at a tick where both would count for detection (waypoint rule).
+
+        traj: optional what-if trajectory for acid; it is sampled but not stored.
+        """
+        return list(self.pair_conflicts(acid, traj, horizontal_only=True))
+
+    def horizontal_pairs(self):
+        """Yield every pair of flights that loses horizontal separation (see horizontal_neighbours)."""
+        for acid1, acid2 in self.index.overlapping_pairs():
+            if self._horizontal_conflict(acid1, acid2):
+                yield acid1, acid2
+
+    def _horizontal_conflict(self, acid1, acid2):
+        ticks = self._check_pair(acid1, acid2, horizontal_only=True)
+        return any(self._eligible(acid1, tick) and self._eligible(acid2, tick) for tick in ticks)
+
+    def replace_flight(self, traj):
+        """Swap in a recompiled trajectory without re-checking pairs (see update)."""
+        self._drop_pairs(traj.acid)
+        self._set_flight(traj)
+
+    def _eligible(self, acid, tick):
+        """True if another plane sharing a waypoint is airborne at this tick."""
+        for other in self.neighbours.get(acid, ()):
+            positions = self.positions.get(other)
+            if positions is not None and tick in positions:
+                return True
+        return False
+
+    def conflicts(self):
+        """Rebuild per-tick clusters from the cached pair conflicts."""
+        pairs_at_tick = {}
+        for key, ticks in self.pair_ticks.items():
+            for tick in ticks:
+                pairs_at_tick.setdefault(tick, []).append(key)
+
+        conflicts = []
+        for tick in sorted(pairs_at_tick):
+            eligible = {}
+            parent = {}
+
+            def find(acid):
+                while parent[acid] != acid:
+                    parent[acid] = parent[parent[acid]]
+                    acid = parent[acid]
+                return acid
+
+            for acid1, acid2 in pairs_at_tick[tick]:
+                for acid in (acid1, acid2):
+                    if acid not in eligible:
+                        eligible[acid] = self._eligible(acid, tick)
+                if not (eligible[acid1] and eligible[acid2]):
+                    continue
+                parent.setdefault(acid1, acid1)
+                parent.setdefault(acid2, acid2)
+                root1, root2 = find(acid1), find(acid2)
+                if root1 != root2:
+                    parent[root2] = root1
+
+            clusters = {}
+            for acid in parent:
+                clusters.setdefault(find(acid), []).append(acid)
+            for members in sorted(clusters.values(), key=lambda m: min(self.order[a] for a in m)):
+                members.sort(key=self.order.get)
+                conflicts.append(members + [tick])
+        return conflicts
@@ -0,0 +1,82 @@
+"""
+Pipeline instrumentation: per-stage timers, counters and file bytes.
+
+The pipeline modules share the module-level `metrics` object:
+
+    with metrics.stage("dedup"):
+        ...
+    metrics.count("pair_checks", n)
+
+Timers and counters are plain dict updates, cheap enough to stay on all the
+time. Hot loops keep a local count and add it once per call, not once per
+pair. report() returns everything as a JSON-ready dict; reset() starts a new
+run. Stages may nest: "resolution" includes any "compile" done by maneuver
+checks, for example. Work done in worker processes (--workers,
+--resolve-workers) is timed as a whole in the parent, not per stage.
+"""
+
+import time
+from contextlib import contextmanager
+
+# Counters every report includes, even when zero, so reports line up
+STANDARD_COUNTERS = ("iterations", "ticks", "plane_ticks", "pair_checks", "haversine_calls",
+                     "trajectories_compiled", "bytes_read", "bytes_written")
+
+
+class Instrumentation:
+    """Accumulates stage timings (seconds, calls) and named counters."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.started = time.perf_counter()
+        self.stages = {}    # name -> [seconds, calls]
+        self.counters = dict.fromkeys(STANDARD_COUNTERS, 0)
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block under name."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds, calls=1):
+        entry = self.stages.get(name)
+        if entry is None:
+            self.stages[name] = [seconds, calls]
+        else:
+            entry[0] += seconds
+            entry[1] += calls
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def report(self):
+        """
+        {"wall_seconds": since reset(),
+         "stages": {name: {"seconds", "calls"}} slowest first,
+         "counters": {name: value}}
+        """
+        stages = sorted(self.stages.items(), key=lambda item: item[1][0], reverse=True)
+        return {
+            "wall_seconds": round(time.perf_counter() - self.started, 4),
+            "stages": {name: {"seconds": round(seconds, 4), "calls": calls}
+                       for name, (seconds, calls) in stages},
+            "counters": dict(self.counters),
+        }
+
+    def print_report(self):
+        report = self.report()
+        print(f"\n{'='*80}")
+        print(f"PROFILE ({report['wall_seconds']:.2f}s wall)")
+        print(f"{'='*80}")
+        for name, entry in report["stages"].items():
+            print(f"  {name:<24} {entry['seconds']:9.3f}s  {entry['calls']:>8} calls")
+        for name, value in report["counters"].items():
+            print(f"  {name:<24} {value:>10}")
+
+
+metrics = Instrumentation()
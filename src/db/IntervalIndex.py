@@ -0,0 +1,89 @@
+"""
+Time-interval index over flights' [departure, arrival] windows.
+
+Most of a 24h schedule has only a small fraction of flights airborne, so
+instead of scanning every flight per tick (or every pair of flights) the
+index yields just the active set per tick, or just the time-overlapping
+pairs, using a sorted sweep over interval start times.
+"""
+
+import heapq
+from bisect import bisect_left, insort
+
+
+class IntervalIndex:
+    """Closed [start, end] intervals keyed by ACID (or any orderable key)."""
+
+    def __init__(self, intervals=None):
+        self._intervals = {}
+        self._starts = []  # sorted (start, key)
+        self._max_length = 0
+        for key, start, end in intervals or ():
+            self.add(key, start, end)
+
+    @classmethod
+    def from_trajectories(cls, trajectories, key=None):
+        """Index compiled trajectories by [departure_unix, last_airborne_unix]."""
+        if key is None:
+            key = lambda idx, traj: traj.acid
+        return cls((key(idx, traj), traj.departure_unix, traj.last_airborne_unix)
+                   for idx, traj in enumerate(trajectories))
+
+    def __len__(self):
+        return len(self._intervals)
+
+    def __contains__(self, key):
+        return key in self._intervals
+
+    def add(self, key, start, end):
+        if key in self._intervals:
+            self.remove(key)
+        self._intervals[key] = (start, end)
+        insort(self._starts, (start, key))
+        self._max_length = max(self._max_length, end - start)
+
+    def remove(self, key):
+        start, _ = self._intervals.pop(key)
+        idx = bisect_left(self._starts, (start, key))
+        del self._starts[idx]
+
+    def interval(self, key):
+        return self._intervals[key]
+
+    def overlapping(self, start, end, exclude=None):
+        """Keys whose interval overlaps (start, end) - touching endpoints don't count."""
+        # Only intervals starting within max_length before `start` can still be open
+        lo = bisect_left(self._starts, (start - self._max_length,))
+        hi = bisect_left(self._starts, (end,))
+        result = []
+        for other_start, key in self._starts[lo:hi]:
+            if key != exclude and self._intervals[key][1] > start:
+                result.append(key)
+        return result
+
+    def overlapping_pairs(self):
+        """Yield each pair of keys whose intervals overlap, once."""
+        active = []
+        for start, key in self._starts:
+            active = [other for other in active if self._intervals[other][1] > start]
+            for other in active:
+                yield other, key
+            active.append(key)
+
+    def sweep(self, times):
+        """
+        For ascending times, yield (time, active) where active is the set of
+        keys with start <= time <= end. The set is reused between steps.
+        """
+        active = set()
+        ends = []  # heap of (end, key) for active keys
+        next_start = 0
+        for t in times:
+            while next_start < len(self._starts) and self._starts[next_start][0] <= t:
+                key = self._starts[next_start][1]
+                active.add(key)
+                heapq.heappush(ends, (self._intervals[key][1], key))
+                next_start += 1
+            while ends and ends[0][0] < t:
+                active.discard(heapq.heappop(ends)[1])
+            yield t, active
@@ -0,0 +1,75 @@
+"""
+What-if evaluation of a single altitude/speed change.
+
+Keeps every flight's compiled trajectory and sampled positions (via
+IncrementalDetector) so a proposed maneuver only has to check the moved
+aircraft against flights that are airborne at the same time, instead of
+re-running the whole simulation. An altitude-only change reuses the cached
+positions; a speed change re-samples just that one flight.
+"""
+
+from FlightPath import Trajectory, compile_flights
+from IncrementalDetector import IncrementalDetector
+from WaypointIndex import build_waypoint_to_acids
+
+
+class ManeuverEvaluator:
+    """Answers "would this move create new conflicts?" against a SimulationState."""
+
+    def __init__(self, state, ping_int=1, trajectories=None, waypoints=None):
+        self.state = state
+        if waypoints is None:
+            waypoints = build_waypoint_to_acids(state.planes)
+        self.detector = IncrementalDetector(ping_int, waypoints=waypoints)
+        if trajectories is None:
+            trajectories = compile_flights(state.planes)
+        self.detector.full(state.planes, trajectories)
+        self.revision = state.revision
+        self.evaluations = 0
+
+    def sync(self):
+        """Pick up planes changed in the state since the last sync. Returns their ACIDs."""
+        changed = self.state.changed_since(self.revision)
+        if changed:
+            trajectories = {acid: Trajectory(self.state.get(acid)) for acid in changed}
+            self.detector.recheck(trajectories, changed)
+        self.revision = self.state.revision
+        return changed
+
+    def current_conflicts(self, acid):
+        """{other ACID: [ticks]} this aircraft is in conflict with right now."""
+        self.sync()
+        return self.detector.pair_conflicts(acid)
+
+    def evaluate_maneuver(self, acid, altitude=None, speed=None):
+        """
+        Check one aircraft at a new altitude and/or speed; nothing is changed.
+
+        Returns:
+            {"acid", "altitude", "speed",
+             "conflicts": {other ACID: [ticks]} after the move,
+             "new":       ACIDs in conflict after the move but not before,
+             "cleared":   ACIDs in conflict before the move but not after}
+        """
+        self.sync()
+        self.evaluations += 1
+        plane = dict(self.state.get(acid))
+        if altitude is not None:
+            plane["altitude"] = altitude
+        if speed is not None:
+            plane["aircraft speed"] = speed
+
+        before = self.detector.pair_conflicts(acid)
+        after = self.detector.pair_conflicts(acid, Trajectory(plane))
+        return {
+            "acid": acid,
+            "altitude": plane.get("altitude"),
+            "speed": plane["aircraft speed"],
+            "conflicts": after,
+            "new": [other for other in after if other not in before],
+            "cleared": [other for other in before if other not in after],
+        }
+
+    def creates_conflicts(self, acid, altitude=None, speed=None):
+        """True if the move would put the aircraft in conflict with anyone it isn't already."""
+        return bool(self.evaluate_maneuver(acid, altitude=altitude, speed=speed)["new"])
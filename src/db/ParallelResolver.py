@@ -0,0 +1,110 @@
+"""
+Resolve independent conflict groups in parallel.
+
+conflict_resolver only reads and writes the aircraft named in the conflict it
+is handling, so conflicts that share no aircraft (directly or through other
+conflicts) cannot affect each other. The conflicts are split into connected
+components of the aircraft-interaction graph, and batches of components are
+resolved in a process pool against a copy of just their aircraft. The
+results are merged back into the shared state. Each component keeps the
+relative order of its conflicts, so the merged state is the same as a
+sequential pass. Interactions between components show up at the next
+detection, which checks the whole schedule.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+from ConflictResolver import conflict_resolver
+from SimulationState import SimulationState
+
+
+def conflict_components(conflicts):
+    """
+    Group conflicts whose aircraft are connected.
+
+    conflicts: [ACID1, ..., timestamp] lists
+    Returns: list of components, each a list of conflicts in input order;
+    components ordered by their first conflict.
+    """
+    parent = {}
+
+    def find(acid):
+        while parent[acid] != acid:
+            parent[acid] = parent[parent[acid]]
+            acid = parent[acid]
+        return acid
+
+    for conflict in conflicts:
+        acids = conflict[:-1] if len(conflict) > 1 else conflict
+        for acid in acids:
+            parent.setdefault(acid, acid)
+        for acid in acids[1:]:
+            root1, root2 = find(acids[0]), find(acid)
+            if root1 != root2:
+                parent[root2] = root1
+
+    components = {}
+    for conflict in conflicts:
+        acids = conflict[:-1] if len(conflict) > 1 else conflict
+        if not acids:
+            continue
+        components.setdefault(find(acids[0]), []).append(conflict)
+    return list(components.values())
+
+
+def _batches(components, n_batches):
+    """Spread components over n_batches, largest first, onto the lightest batch."""
+    batches = [[] for _ in range(min(n_batches, len(components)))]
+    loads = [0] * len(batches)
+    for component in sorted(components, key=len, reverse=True):
+        lightest = loads.index(min(loads))
+        batches[lightest].append(component)
+        loads[lightest] += len(component)
+    return batches
+
+
+def _resolve_batch(args):
+    """Worker: resolve each component against a private copy of its aircraft."""
+    planes, components = args
+    state = SimulationState(planes)
+    # One pass over the batch: components share no aircraft, so this is the
+    # same as resolving them one after another
+    conflict_resolver([conflict for component in components for conflict in component], state=state)
+    # Only what changed goes back; the rest is untouched in the parent
+    return [(plane["ACID"], plane["altitude"], plane["aircraft speed"], plane["changes"])
+            for plane in state.planes if plane["ACID"] in state.dirty]
+
+
+def resolve_parallel(conflicts, state, workers=2, pool=None):
+    """
+    Run conflict_resolver over conflicts, with independent components in parallel.
+
+    state: in-memory SimulationState, updated in place
+    pool: optional ProcessPoolExecutor to reuse across calls
+    Returns the ACIDs that changed.
+    """
+    components = conflict_components(conflicts)
+    if workers <= 1 or len(components) <= 1:
+        before = state.revision
+        conflict_resolver(conflicts, state=state)
+        return state.changed_since(before)
+
+    # A few batches per worker keeps the pool busy when component sizes vary
+    jobs = []
+    for batch in _batches(components, workers * 4):
+        acids = {acid for component in batch for conflict in component
+                 for acid in (conflict[:-1] if len(conflict) > 1 else conflict)}
+        planes = [dict(state.get(acid)) for acid in sorted(acids) if acid in state]
+        jobs.append((planes, batch))
+
+    changed = set()
+    if pool is None:
+        with ProcessPoolExecutor(max_workers=workers) as own_pool:
+            results = list(own_pool.map(_resolve_batch, jobs))
+    else:
+        results = list(pool.map(_resolve_batch, jobs))
+    for updates in results:
+        for acid, altitude, speed, changes in updates:
+            state.set_plane(acid, altitude=altitude, speed=speed, changes=changes)
+            changed.add(acid)
+    return changed
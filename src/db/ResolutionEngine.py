@@ -0,0 +1,338 @@
+"""
+In-process conflict resolution engine.
+
+Keeps flights, compiled trajectories and simulation state in memory across
+detect/resolve iterations instead of re-running FlightPath.py in a fresh
+process (and round-tripping through conflicts.json) every iteration.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from ConflictResolver import STATE_FILE, conflict_resolver
+from ConflictEvents import events_to_conflict_list
+from FlightPath import Trajectory, detect_conflicts, dedupe_conflict_events
+from GlobalResolver import GlobalResolver
+from Instrumentation import metrics
+from ParallelResolver import resolve_parallel
+from IncrementalDetector import IncrementalDetector
+from ManeuverEvaluator import ManeuverEvaluator
+from SimulationState import SimulationState, write_json_atomic
+from WaypointIndex import build_waypoint_to_acids
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFLICTS_FILE = os.path.join(SCRIPT_DIR, "conflicts.json")
+EVENTS_FILE = os.path.join(SCRIPT_DIR, "conflict_events.json")
+
+MAX_ITERATIONS = 100  # Safety limit to prevent infinite loops
+MAX_STUCK_ITERATIONS = 5  # If same count for 5 iterations, consider it stuck
+SUCCESS_THRESHOLD = 3  # Remaining conflicts at or below this count are treated as success
+
+
+def detect_oscillation(recent_counts):
+    """Return the repeating pattern (e.g. [2, 3, 4]) if recent counts cycle, else None."""
+    if len(recent_counts) < 6:
+        return None
+    # Check if we're cycling through the same values
+    last_6 = recent_counts[-6:]
+    if len(set(last_6)) > 3:  # Only 2-3 unique values
+        return None
+    # Check if it's a repeating pattern
+    for pattern_len in [2, 3, 4]:
+        if len(last_6) >= pattern_len * 2:
+            pattern = last_6[-pattern_len:]
+            prev_pattern = last_6[-pattern_len * 2:-pattern_len]
+            if pattern == prev_pattern:
+                return pattern
+    return None
+
+
+class BestState:
+    """
+    Lowest-conflict state seen during a run, for returning the best answer
+    instead of whatever the last iteration left behind.
+
+    Holds (altitude, speed, changes) for every plane as of the best state.
+    A new best only copies the planes changed since the previous one, and
+    restore() only writes back the planes changed since the best, so both
+    cost a few dict updates per moved aircraft.
+    """
+
+    def __init__(self, state):
+        self.state = state
+        self.values = {plane["ACID"]: self._values(plane) for plane in state.planes}
+        self.revision = state.revision
+        self.conflicts = None
+        self.events = None
+        self.iteration = None
+        self.offers = 0
+
+    @staticmethod
+    def _values(plane):
+        return plane.get("altitude"), plane["aircraft speed"], plane.get("changes")
+
+    def offer(self, conflicts, events):
+        """Record the current state if it has fewer conflicts than the best so far. Returns True if so."""
+        self.offers += 1
+        if self.conflicts is not None and len(conflicts) >= len(self.conflicts):
+            return False
+        for acid in self.state.changed_since(self.revision):
+            self.values[acid] = self._values(self.state.get(acid))
+        self.revision = self.state.revision
+        self.conflicts = conflicts
+        self.events = events
+        self.iteration = self.offers
+        return True
+
+    def restore(self):
+        """Put the best state's values back into the state. Returns the ACIDs changed."""
+        changed = self.state.changed_since(self.revision)
+        for acid in changed:
+            altitude, speed, changes = self.values[acid]
+            self.state.set_plane(acid, altitude=altitude, speed=speed, changes=changes)
+        self.revision = self.state.revision
+        return changed
+
+
+class ResolutionEngine:
+    """
+    Detect/resolve loop over an in-memory SimulationState.
+
+    Trajectories are cached per ACID and only recompiled for planes the
+    resolver changed since the previous detection. With incremental=True,
+    detection after the first iteration only re-checks pairs involving those
+    planes (see IncrementalDetector). compact=True loads the state into a
+    columnar FlightTable. global_resolve=True replaces the per-cluster nudges
+    with one GlobalResolver pass over all aircraft per iteration.
+    resolve_workers > 1 resolves independent conflict groups in a process
+    pool (see ParallelResolver); the resulting state is the same.
+    check_moves=True makes the resolver skip moves that a ManeuverEvaluator
+    says would create new conflicts.
+    """
+
+    def __init__(self, state=None, state_file=STATE_FILE, ping_int=1, backend="python", use_cpa=False,
+                 incremental=False, compact=False, global_resolve=False, resolve_workers=1,
+                 check_moves=False):
+        if incremental and use_cpa:
+            raise ValueError("incremental detection works on sampled positions, not CPA")
+        if check_moves and resolve_workers > 1:
+            raise ValueError("move checking needs the shared state; use resolve_workers=1")
+        self.state = state if state is not None else SimulationState.load(state_file, compact=compact)
+        self.ping_int = ping_int
+        self.backend = backend
+        self.use_cpa = use_cpa
+        # Built from the state itself, as detect_conflicts does for a full detection
+        self.waypoints = build_waypoint_to_acids(self.state.planes)
+        self.incremental = IncrementalDetector(ping_int, waypoints=self.waypoints) if incremental else None
+        self.global_resolve = global_resolve
+        self.resolve_workers = resolve_workers
+        self._pool = None
+        self.check_moves = check_moves
+        self.evaluator = None
+        self.trajectories = {}
+        self._compiled_revision = None
+        self.last_conflicts = []
+        self.last_events = []
+        self.last_unresolved = []
+        self.best = None
+
+    def _refresh_trajectories(self):
+        """Recompile stale trajectories. Returns (ordered trajectories, changed ACIDs or None)."""
+        if self._compiled_revision is None:
+            changed = None
+            stale = [plane["ACID"] for plane in self.state.planes]
+        else:
+            changed = stale = self.state.changed_since(self._compiled_revision)
+        with metrics.stage("compile"):
+            for acid in stale:
+                self.trajectories[acid] = Trajectory(self.state.get(acid))
+        self._compiled_revision = self.state.revision
+        return [self.trajectories[plane["ACID"]] for plane in self.state.planes], changed
+
+    def detect(self):
+        """Detect and dedupe conflicts for the current in-memory state."""
+        trajectories, changed = self._refresh_trajectories()
+        if self.incremental is not None:
+            with metrics.stage("incremental_detection"):
+                if changed is None:
+                    conflicts = self.incremental.full(self.state.planes, trajectories)
+                else:
+                    conflicts = self.incremental.update(self.trajectories, changed)
+        else:
+            conflicts = detect_conflicts(self.state.planes, self.ping_int, backend=self.backend,
+                                         use_cpa=self.use_cpa, trajectories=trajectories)
+        metrics.count("raw_conflicts", len(conflicts))
+        with metrics.stage("dedup"):
+            self.last_events = dedupe_conflict_events(conflicts, self.ping_int)
+            self.last_conflicts = events_to_conflict_list(self.last_events)
+        return self.last_conflicts
+
+    def resolve(self, conflicts):
+        """Apply one resolver pass to the in-memory state."""
+        with metrics.stage("resolution"):
+            self._resolve(conflicts)
+
+    def _resolve(self, conflicts):
+        if self.resolve_workers > 1:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.resolve_workers)
+            resolve_parallel(conflicts, self.state, self.resolve_workers, pool=self._pool)
+        elif self.check_moves:
+            if self.evaluator is None:
+                trajectories, _ = self._refresh_trajectories()
+                self.evaluator = ManeuverEvaluator(self.state, self.ping_int, trajectories,
+                                                   waypoints=self.waypoints)
+            conflict_resolver(conflicts, state=self.state, evaluator=self.evaluator)
+        else:
+            conflict_resolver(conflicts, state=self.state)
+
+    def close(self):
+        """Shut down the resolver worker pool, if one was started."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def step(self):
+        """One iteration: detect, then resolve what was found. Returns the conflicts."""
+        metrics.count("iterations")
+        conflicts = self.detect()
+        if self.best is not None:
+            # Conflicts describe the state as it is now, before this iteration's moves
+            self.best.offer(conflicts, self.last_events)
+        if self.global_resolve:
+            if conflicts:
+                self.resolve_global()
+        else:
+            self.resolve(conflicts)
+        if self.state.binary is not None:
+            # Patching mmapped records costs a few bytes per changed plane, so
+            # a binary state file is kept current after every iteration
+            self.state.flush()
+        return conflicts
+
+    def resolve_global(self):
+        """Assign levels/speeds to all aircraft at once (see GlobalResolver). Returns changed ACIDs."""
+        trajectories, _ = self._refresh_trajectories()
+        resolver = GlobalResolver(self.state, self.ping_int, waypoints=self.waypoints)
+        with metrics.stage("global_resolution"):
+            changed = resolver.resolve(trajectories)
+        self.last_unresolved = resolver.unresolved
+        return changed
+
+    def save(self, conflicts_file=CONFLICTS_FILE, events_file=EVENTS_FILE):
+        """Write the state file (if changed) and the last detected conflicts/events."""
+        self.state.flush()
+        write_json_atomic(conflicts_file, self.last_conflicts)
+        if events_file is not None:
+            write_json_atomic(events_file, self.last_events)
+
+    def run(self, max_iterations=MAX_ITERATIONS, on_iteration=None, should_stop=None,
+            budget_s=None, keep_best=False):
+        """
+        Iterate detect/resolve until conflicts reach the success threshold,
+        stop changing, oscillate, or max_iterations is hit.
+
+        on_iteration: optional callback(result_dict) called after each iteration.
+        should_stop: optional callable checked after each iteration; returning
+                     True ends the run with status "cancelled".
+        budget_s: optional wall-clock budget in seconds. The run ends with
+                  status "timeout" before starting an iteration that the
+                  last one's duration says would not finish in time.
+        keep_best: track the lowest-conflict state detected and leave the
+                   state there when the run ends, however it ends.
+        Returns a summary dict:
+            results:     [{"iteration", "conflicts", "changed", "elapsed_s",
+                           "oscillation"}, ...]
+            status:      "resolved" | "threshold" | "stabilized" | "oscillating"
+                         | "stuck" | "max_iterations" | "cancelled" | "timeout"
+            oscillation: repeating pattern if oscillation was detected, else None
+            best_iteration: iteration whose detected state was kept (keep_best), else None
+            final_conflicts: conflicts from the last detection (or of the kept state)
+        """
+        results = []
+        recent_counts = []
+        previous_count = None
+        stuck_count = 0
+        status = "max_iterations"
+        oscillation = None
+        start = time.time()
+        iteration_start = start
+        self.best = BestState(self.state) if keep_best else None
+
+        try:
+            for iteration in range(1, max_iterations + 1):
+                conflict_count = len(self.step())
+
+                # Track recent counts for oscillation detection
+                recent_counts.append(conflict_count)
+                if len(recent_counts) > 10:
+                    recent_counts.pop(0)
+                oscillation = detect_oscillation(recent_counts)
+
+                result = {
+                    "iteration": iteration,
+                    "conflicts": conflict_count,
+                    "changed": previous_count != conflict_count if previous_count is not None else True,
+                    "elapsed_s": round(time.time() - start, 3),
+                    "oscillation": oscillation,
+                }
+                results.append(result)
+                if on_iteration is not None:
+                    on_iteration(result)
+
+                if oscillation is not None:
+                    status = "oscillating"
+                    break
+
+                # Check if stuck (same count for multiple iterations)
+                if previous_count == conflict_count:
+                    stuck_count += 1
+                    if conflict_count <= SUCCESS_THRESHOLD:
+                        status = "stabilized"
+                        break
+                    elif stuck_count >= MAX_STUCK_ITERATIONS:
+                        status = "stuck"
+                        break
+                else:
+                    stuck_count = 0
+
+                # Check if resolved (0 conflicts) or success threshold reached
+                if conflict_count == 0:
+                    status = "resolved"
+                    break
+                elif conflict_count <= SUCCESS_THRESHOLD:
+                    status = "threshold"
+                    break
+
+                if should_stop is not None and should_stop():
+                    status = "cancelled"
+                    break
+
+                if budget_s is not None:
+                    now = time.time()
+                    if now + (now - iteration_start) - start > budget_s:
+                        status = "timeout"
+                        break
+                    iteration_start = now
+
+                previous_count = conflict_count
+        finally:
+            # Worker processes are not kept between runs
+            self.close()
+
+        best_iteration = None
+        if self.best is not None and self.best.conflicts is not None:
+            # The last iteration's moves were never checked; go back to the best checked state
+            self.best.restore()
+            self.last_conflicts = self.best.conflicts
+            self.last_events = self.best.events
+            best_iteration = self.best.iteration
+
+        return {
+            "results": results,
+            "status": status,
+            "oscillation": oscillation,
+            "best_iteration": best_iteration,
+            "final_conflicts": self.last_conflicts
+        }
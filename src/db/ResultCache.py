@@ -0,0 +1,162 @@
+"""
+Content-addressed on-disk cache of detection/resolution results.
+
+A result is stored under the SHA-256 of everything it was computed from: the
+contents of the input files (flights.json, simulation_state.json,
+plane_info.json) or of an in-memory flight list, the separation minima and
+the run parameters (ping interval, resolver mode, ...). Re-running on
+unchanged inputs returns the stored result instead of re-running the
+pipeline.
+
+Entries are gzipped JSON files, one per key, written atomically so several
+processes can share the directory. Reading an entry touches its mtime; when
+the directory grows past max_bytes the least recently used entries are
+deleted first.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+
+from ConflictFinder import HORIZONTAL_SEPARATION_NM, VERTICAL_SEPARATION_FT
+from Instrumentation import metrics
+from WaypointIndex import file_sha256
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(SCRIPT_DIR, ".result_cache")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Bump when the cached result format or the pipeline's output changes
+CACHE_VERSION = 4
+ENTRY_SUFFIX = ".json.gz"
+
+
+def _finish_key(digest, params):
+    params = dict(params,
+                  horizontal_separation_nm=HORIZONTAL_SEPARATION_NM,
+                  vertical_separation_ft=VERTICAL_SEPARATION_FT,
+                  cache_version=CACHE_VERSION)
+    digest.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def cache_key(input_files, **params):
+    """
+    Hex key for a result computed from input_files with params.
+
+    input_files: paths whose contents the result depends on (order matters)
+    params: JSON-serializable run parameters; separation minima are added
+    """
+    digest = hashlib.sha256()
+    for path in input_files:
+        digest.update(os.path.basename(path).encode("utf-8"))
+        digest.update(file_sha256(path).encode("ascii"))
+    return _finish_key(digest, params)
+
+
+def flights_key(flights, **params):
+    """
+    Hex key for a result computed from an in-memory flight list with params.
+
+    flights: flight dicts (or FlightTable rows) in order, as passed to the
+             pipeline; their full contents are hashed
+    params: as for cache_key
+    """
+    digest = hashlib.sha256(b"flights:")
+    for flight in flights:
+        digest.update(json.dumps(dict(flight), sort_keys=True, separators=(",", ":")).encode("utf-8"))
+        digest.update(b"\n")
+    return _finish_key(digest, params)
+
+
+class ResultCache:
+    """Directory of gzipped JSON results, bounded by total size (LRU eviction)."""
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    def get(self, key):
+        """Stored result for key, or None. A hit marks the entry as recently used."""
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                result = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError, EOFError):
+            # Missing, evicted by another process mid-read, or truncated
+            self.misses += 1
+            metrics.count("cache_misses")
+            return None
+        self.hits += 1
+        metrics.count("cache_hits")
+        return result
+
+    def put(self, key, result):
+        """Store result (JSON-serializable) under key, then evict down to max_bytes."""
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp_", suffix=ENTRY_SUFFIX)
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as f:
+                json.dump(result, f, separators=(",", ":"))
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict(keep=key)
+
+    def entries(self):
+        """[(mtime, size, path)] for every stored entry, least recently used first."""
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return entries
+        for name in names:
+            if not name.endswith(ENTRY_SUFFIX) or name.startswith(".tmp_"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep=None):
+        """Delete least recently used entries until the total is within max_bytes. Returns the count."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        keep_path = self._path(keep) if keep is not None else None
+        removed = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep_path:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
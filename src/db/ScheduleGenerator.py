@@ -0,0 +1,126 @@
+"""
+Deterministic synthetic flight schedules in the flights.json format.
+
+Used by benchmark.py to scale the bundled 1000-flight schedule up (or down)
+without hand-editing flights.json. Flights use the airports table from
+FlightPath.py, plane types and altitude/speed bounds from plane_info.json,
+and routes of 1-3 "DD.DDN/DDD.DDDW" waypoints like the bundled schedule.
+The same (n_flights, seed) always produces the same schedule.
+"""
+
+import json
+import math
+import random
+
+from ConflictResolver import load_aircraft_types
+from FlightPath import airports
+
+# The bundled schedule's 12 waypoints; larger schedules add more in the same
+# style so the number of flights per waypoint stays about the same
+BASE_WAYPOINTS = [
+    "46.15N/84.33W", "49.64N/92.114W", "49.97N/110.935W", "48.22N/118.55W",
+    "49.82N/86.449W", "50.77N/115.66W", "44.55N/75.22W", "45.88N/78.031W",
+    "47.50N/69.88W", "51.33N/100.44W", "50.18N/71.405W", "52.45N/105.22W",
+]
+FLIGHTS_PER_WAYPOINT_SET = 1000
+
+START_UNIX = 1767780000           # first departure of the bundled schedule
+DEPARTURE_WINDOW_S = 19 * 3600    # bundled departures span about 19 hours
+
+ROUTE_LENGTH_WEIGHTS = {1: 54, 2: 41, 3: 5}   # waypoints per route, as bundled
+PASSENGER_AIRLINES = ["ACA", "FLE", "PAL", "WJA"]
+CARGO_AIRLINES = ["ACA", "CCA", "FDX", "UPS"]
+PASSENGER_RANGE = {
+    "wide-body": (250, 350),
+    "narrow-body": (120, 190),
+    "regional-jet": (70, 130),
+    "turboprop": (50, 78),
+}
+
+
+def waypoint_pool(n_flights, rng):
+    """BASE_WAYPOINTS plus 12 generated waypoints per extra 1000 flights."""
+    waypoints = list(BASE_WAYPOINTS)
+    extra_sets = max(0, math.ceil(n_flights / FLIGHTS_PER_WAYPOINT_SET) - 1)
+    seen = set(waypoints)
+    while len(waypoints) < len(BASE_WAYPOINTS) * (1 + extra_sets):
+        # Same box as the bundled waypoints (southern Canada)
+        waypoint = f"{rng.uniform(44.0, 53.0):.2f}N/{rng.uniform(63.0, 123.0):.3f}W"
+        if waypoint not in seen:
+            seen.add(waypoint)
+            waypoints.append(waypoint)
+    return waypoints
+
+
+def generate_schedule(n_flights, seed=0, aircraft_types=None):
+    """
+    Returns n_flights flight dicts (flights.json format), sorted by departure time.
+
+    ACIDs are unique: airline prefix + a number (3 digits, more once an
+    airline runs out). Altitudes are whole thousands of feet and speeds whole
+    knots, both within the plane type's plane_info.json bounds.
+    """
+    rng = random.Random(seed)
+    if aircraft_types is None:
+        aircraft_types = load_aircraft_types()
+    type_names = sorted(aircraft_types)
+    airport_codes = sorted(airports)
+    waypoints = waypoint_pool(n_flights, rng)
+    route_lengths = list(ROUTE_LENGTH_WEIGHTS)
+    route_weights = [ROUTE_LENGTH_WEIGHTS[n] for n in route_lengths]
+    next_number = {}
+
+    flights = []
+    for _ in range(n_flights):
+        plane_type = rng.choice(type_names)
+        info = aircraft_types[plane_type]
+        is_cargo = info["role"] == "cargo"
+
+        airline = rng.choice(CARGO_AIRLINES if is_cargo else PASSENGER_AIRLINES)
+        number = next_number.get(airline, 100)
+        next_number[airline] = number + 1
+
+        departure, arrival = rng.sample(airport_codes, 2)
+        n_waypoints = rng.choices(route_lengths, route_weights)[0]
+        route = " ".join(rng.sample(waypoints, n_waypoints))
+
+        low, high = info["altitude"]["min"], info["altitude"]["max"]
+        altitude = rng.randrange(-(-low // 1000) * 1000, high + 1, 1000)
+        speed = float(rng.randint(info["speed"]["min"], info["speed"]["max"]))
+
+        if is_cargo:
+            passengers = 0
+        else:
+            passengers = rng.randint(*PASSENGER_RANGE.get(info["category"], (50, 200)))
+
+        flights.append({
+            "ACID": f"{airline}{number}",
+            "Plane type": plane_type,
+            "route": route,
+            "altitude": altitude,
+            "departure airport": departure,
+            "arrival airport": arrival,
+            # Whole minutes, like the bundled schedule
+            "departure time": START_UNIX + rng.randrange(0, DEPARTURE_WINDOW_S, 60),
+            "aircraft speed": speed,
+            "passengers": passengers,
+            "is_cargo": is_cargo,
+        })
+
+    # The simulation starts at the first flight's departure
+    flights.sort(key=lambda flight: (flight["departure time"], flight["ACID"]))
+    return flights
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Usage: python ScheduleGenerator.py 5000 flights_5000.json [--seed 1]
+    if len(sys.argv) < 3:
+        print("Usage: python ScheduleGenerator.py N_FLIGHTS OUTPUT.json [--seed N]")
+        sys.exit(1)
+    seed = int(sys.argv[sys.argv.index('--seed') + 1]) if '--seed' in sys.argv else 0
+    schedule = generate_schedule(int(sys.argv[1]), seed=seed)
+    with open(sys.argv[2], "w") as f:
+        json.dump(schedule, f, indent=2)
+    print(f"Wrote {len(schedule)} flights to {sys.argv[2]}")
@@ -0,0 +1,134 @@
+import json
+import os
+import tempfile
+
+from BinaryState import BinaryStateFile, is_binary_state
+from FlightTable import FlightTable
+from Instrumentation import metrics
+
+
+def replace_mode(path):
+    """Permissions for a file replacing path: keep the old file's, else rw-r--r--."""
+    try:
+        return os.stat(path).st_mode & 0o777
+    except OSError:
+        return 0o644
+
+
+def write_json_atomic(path, data):
+    """Write JSON to a temp file in the same directory, then rename over path."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".json")
+    try:
+        with metrics.stage("write_json"), os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2)
+            metrics.count("bytes_written", f.tell())
+        # mkstemp creates the file 0600
+        os.chmod(tmp_path, replace_mode(path))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class SimulationState:
+    """
+    In-memory copy of simulation_state.json.
+
+    Planes are kept in file order and indexed by ACID. Updates only touch
+    memory and mark the plane dirty; flush() writes the file back once,
+    atomically, when something actually changed.
+
+    planes may also be a FlightTable; planes are then row views and updates
+    go straight into its columns. A state loaded from a binary state file
+    (see BinaryState) is flushed by patching only the dirty planes' records.
+    """
+
+    def __init__(self, planes, path=None, binary=None):
+        self.path = path
+        self.binary = binary
+        self.table = planes if isinstance(planes, FlightTable) else None
+        self.planes = list(planes) if self.table is not None else planes
+        self.by_acid = {plane["ACID"]: plane for plane in planes}
+        self.dirty = set()
+        # Monotonic change counter so callers can ask what changed since a point
+        self.revision = 0
+        self.revisions = {}
+
+    @classmethod
+    def load(cls, path, compact=False):
+        """compact=True keeps the planes in a FlightTable instead of dicts."""
+        with metrics.stage("load_state"):
+            metrics.count("bytes_read", os.path.getsize(path))
+            return cls._load(path, compact)
+
+    @classmethod
+    def _load(cls, path, compact):
+        if is_binary_state(path):
+            binary = BinaryStateFile(path)
+            planes = binary.planes()
+            return cls(FlightTable.from_flights(planes) if compact else planes, path, binary)
+        if compact:
+            return cls(FlightTable.load(path), path)
+        with open(path, "r") as f:
+            return cls(json.load(f), path)
+
+    def __contains__(self, acid):
+        return acid in self.by_acid
+
+    def __len__(self):
+        return len(self.planes)
+
+    def get(self, acid):
+        return self.by_acid.get(acid)
+
+    def update_plane(self, acid, new_altitude=None, new_speed=None):
+        """Update altitude/speed and increment changes. Returns False if ACID is unknown."""
+        plane = self.by_acid.get(acid)
+        if plane is None:
+            return False
+        if new_altitude is not None:
+            plane["altitude"] = new_altitude
+        if new_speed is not None:
+            plane["aircraft speed"] = new_speed
+        plane["changes"] = plane.get("changes", 0) + 1
+        self.dirty.add(acid)
+        self.revision += 1
+        self.revisions[acid] = self.revision
+        return True
+
+    def set_plane(self, acid, altitude=None, speed=None, changes=None):
+        """Overwrite fields with values computed elsewhere (e.g. a worker's copy of the plane)."""
+        plane = self.by_acid.get(acid)
+        if plane is None:
+            return False
+        if altitude is not None:
+            plane["altitude"] = altitude
+        if speed is not None:
+            plane["aircraft speed"] = speed
+        if changes is not None:
+            plane["changes"] = changes
+        self.dirty.add(acid)
+        self.revision += 1
+        self.revisions[acid] = self.revision
+        return True
+
+    def changed_since(self, revision):
+        """ACIDs updated after the given revision number."""
+        return {acid for acid, rev in self.revisions.items() if rev > revision}
+
+    def flush(self, force=False):
+        """Write back to disk if anything changed (or force=True)."""
+        if self.path is None or (not self.dirty and not force):
+            return False
+        if self.binary is not None:
+            # Fixed-width records: rewrite only what changed, in place
+            for acid in self.dirty:
+                self.binary.patch_plane(self.by_acid[acid])
+            self.binary.flush()
+            self.dirty.clear()
+            return True
+        write_json_atomic(self.path, self.table.to_flights() if self.table is not None else self.planes)
+        self.dirty.clear()
+        return True
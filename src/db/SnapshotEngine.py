@@ -0,0 +1,151 @@
+"""
+Vectorized snapshot engine (optional NumPy backend for simulate_all_flights).
+
+Computes every airborne aircraft's position for a whole time grid with
+batched array operations instead of a per-flight, per-tick Python loop.
+Positions follow exactly the same rules as Trajectory.position_at, so the
+snapshots match the pure-Python path within floating-point tolerance.
+"""
+
+import math
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional - the pure-Python simulator still works
+    np = None
+
+
+def numpy_available():
+    return np is not None
+
+
+def _leg_tables(trajectories):
+    """Pad per-flight leg data into (flight x max_legs) arrays."""
+    n_flights = len(trajectories)
+    max_legs = max(len(traj.leg_distances) for traj in trajectories)
+
+    # Unused leg slots get +inf cumulative distance so they are never selected
+    cum = np.full((n_flights, max_legs), np.inf)
+    leg_dist = np.ones((n_flights, max_legs))
+    lat1 = np.zeros((n_flights, max_legs))
+    lon1 = np.zeros((n_flights, max_legs))
+    lat2 = np.zeros((n_flights, max_legs))
+    lon2 = np.zeros((n_flights, max_legs))
+
+    for f, traj in enumerate(trajectories):
+        n_legs = len(traj.leg_distances)
+        cum[f, :n_legs] = traj.cum_distances
+        leg_dist[f, :n_legs] = traj.leg_distances
+        for leg_idx in range(n_legs):
+            start_pt = traj.path[leg_idx]
+            end_pt = traj.path[leg_idx + 1]
+            lat1[f, leg_idx] = math.radians(start_pt[0])
+            lon1[f, leg_idx] = math.radians(start_pt[1])
+            lat2[f, leg_idx] = math.radians(end_pt[0])
+            lon2[f, leg_idx] = math.radians(end_pt[1])
+
+    return cum, leg_dist, lat1, lon1, lat2, lon2
+
+
+def simulate_grid(trajectories, sim_start_unix: int, sim_end_unix: int, ping_int: int,
+                  tick_range=None):
+    """
+    Compute positions for every (tick, flight) on the simulation time grid.
+
+    trajectories: list of compiled Trajectory objects (see FlightPath.compile_flights)
+    tick_range: optional (start, stop) slice of the grid's ticks; only those
+                rows are computed, so a time shard costs its share of the day.
+    Returns a dict:
+        "timestamps": (T,) minutes since sim start for each tick
+        "acids":      list of F ACIDs (same order as trajectories)
+        "lat", "lon", "alt": (T x F) float arrays, NaN where not airborne
+    """
+    if np is None:
+        raise ImportError("The numpy snapshot backend requires numpy (pip install numpy)")
+
+    n_ticks = (sim_end_unix - sim_start_unix) // (ping_int * 60) + 1
+    start, stop = tick_range if tick_range is not None else (0, n_ticks)
+    stop = max(0, min(stop, n_ticks))
+    start = max(0, min(start, stop))
+    n_ticks = stop - start
+    timestamps = np.arange(start, stop, dtype=np.int64) * ping_int
+    n_flights = len(trajectories)
+
+    lat = np.full((n_ticks, n_flights), np.nan)
+    lon = np.full((n_ticks, n_flights), np.nan)
+    alt = np.full((n_ticks, n_flights), np.nan)
+    grid = {"timestamps": timestamps, "acids": [traj.acid for traj in trajectories],
+            "lat": lat, "lon": lon, "alt": alt}
+    if n_flights == 0 or n_ticks <= 0:
+        return grid
+
+    departures = np.array([traj.departure_unix for traj in trajectories], dtype=np.int64)
+    speeds = np.array([traj.speed for traj in trajectories], dtype=np.float64)
+    total_minutes = np.array([traj.total_minutes for traj in trajectories], dtype=np.float64)
+    altitudes = np.array([traj.altitude for traj in trajectories], dtype=np.float64)
+
+    # Whole minutes since departure, truncated toward zero like int() does
+    tick_unix = sim_start_unix + timestamps * 60
+    minutes_since_dep = np.trunc((tick_unix[:, None] - departures[None, :]) / 60)
+    airborne = (minutes_since_dep > 0) & (minutes_since_dep < total_minutes[None, :])
+
+    tick_idx, flight_idx = np.nonzero(airborne)
+    minutes = minutes_since_dep[tick_idx, flight_idx]
+    distance_traveled_nm = (minutes / 60) * speeds[flight_idx]
+
+    # Row-wise searchsorted (bisect_left) over each flight's cumulative leg distances
+    cum, leg_dist, lat1, lon1, lat2, lon2 = _leg_tables(trajectories)
+    leg_idx = (cum[flight_idx] < distance_traveled_nm[:, None]).sum(axis=1)
+
+    # Drop points past the last leg (position_at returns None there)
+    n_legs = np.array([len(traj.leg_distances) for traj in trajectories])
+    valid = leg_idx < n_legs[flight_idx]
+    tick_idx, flight_idx = tick_idx[valid], flight_idx[valid]
+    leg_idx, distance_traveled_nm = leg_idx[valid], distance_traveled_nm[valid]
+
+    prev_cum = np.where(leg_idx > 0, cum[flight_idx, np.maximum(leg_idx - 1, 0)], 0.0)
+    fraction = (distance_traveled_nm - prev_cum) / leg_dist[flight_idx, leg_idx]
+
+    # Vectorized slerp (same formula as great_circle_interpolate)
+    p_lat1 = lat1[flight_idx, leg_idx]
+    p_lon1 = lon1[flight_idx, leg_idx]
+    p_lat2 = lat2[flight_idx, leg_idx]
+    p_lon2 = lon2[flight_idx, leg_idx]
+    d = 2 * np.arcsin(np.sqrt(np.sin((p_lat2 - p_lat1) / 2) ** 2 +
+                              np.cos(p_lat1) * np.cos(p_lat2) * np.sin((p_lon2 - p_lon1) / 2) ** 2))
+    a = np.sin((1 - fraction) * d) / np.sin(d)
+    b = np.sin(fraction * d) / np.sin(d)
+    x = a * np.cos(p_lat1) * np.cos(p_lon1) + b * np.cos(p_lat2) * np.cos(p_lon2)
+    y = a * np.cos(p_lat1) * np.sin(p_lon1) + b * np.cos(p_lat2) * np.sin(p_lon2)
+    z = a * np.sin(p_lat1) + b * np.sin(p_lat2)
+
+    lat[tick_idx, flight_idx] = np.degrees(np.arctan2(z, np.sqrt(x * x + y * y)))
+    lon[tick_idx, flight_idx] = np.degrees(np.arctan2(y, x))
+    alt[tick_idx, flight_idx] = altitudes[flight_idx]
+    return grid
+
+
+def iter_grid_snapshots(grid, trajectories, tick_range=None):
+    """Yield a simulate_grid result one snapshot at a time (optionally a (start, stop) slice of ticks)."""
+    lat, lon = grid["lat"], grid["lon"]
+    airborne = ~np.isnan(lat)
+    start, stop = tick_range if tick_range is not None else (0, len(grid["timestamps"]))
+    for tick in range(start, min(stop, len(grid["timestamps"]))):
+        planes = []
+        for f in np.flatnonzero(airborne[tick]):
+            traj = trajectories[f]
+            planes.append({
+                "ACID": traj.acid,
+                "lat": float(lat[tick, f]),
+                "lon": float(lon[tick, f]),
+                "alt": traj.altitude
+            })
+        yield {
+            "timestamp": int(grid["timestamps"][tick]),
+            "planes": planes
+        }
+
+
+def grid_to_snapshots(grid, trajectories):
+    """Convert a simulate_grid result into the list-of-snapshots format."""
+    return list(iter_grid_snapshots(grid, trajectories))
@@ -0,0 +1,49 @@
+"""
+Snapshot files: one JSON snapshot per line (NDJSON).
+
+Lets a simulation run be written out tick by tick while detection consumes
+the same generator, and replayed later without loading the whole day into
+memory. Paths ending in .gz are gzip-compressed.
+"""
+
+import gzip
+import json
+
+
+def _open(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def write_snapshots(snapshots, path):
+    """Write an iterable of snapshots to path. Returns the number written."""
+    count = 0
+    with _open(path, "w") as f:
+        for snapshot in snapshots:
+            f.write(json.dumps(snapshot, separators=(",", ":")))
+            f.write("\n")
+            count += 1
+    return count
+
+
+def tee_snapshots(snapshots, f):
+    """Yield snapshots unchanged while writing each one as a line to the open file f."""
+    for snapshot in snapshots:
+        f.write(json.dumps(snapshot, separators=(",", ":")))
+        f.write("\n")
+        yield snapshot
+
+
+def open_snapshot_file(path):
+    """Open a snapshot file for writing (gzip if path ends in .gz), for use with tee_snapshots."""
+    return _open(path, "w")
+
+
+def read_snapshots(path):
+    """Yield snapshots from an NDJSON snapshot file one at a time."""
+    with _open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
@@ -0,0 +1,109 @@
+"""
+Waypoint -> ACID index built straight from flights.json.
+
+Same map as buildWaypointToAcidsMap in src/utils/routeUtils.js (one entry per
+route token, ACIDs in flight order, no duplicates per waypoint), so the
+detector no longer depends on a separately exported waypointToAcids.json.
+The built map is cached next to flights.json together with the SHA-256 of
+the flights file it came from, and only rebuilt when that hash changes.
+"""
+
+import hashlib
+import json
+import os
+
+from SimulationState import write_json_atomic
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+FLIGHTS_FILE = os.path.join(SCRIPT_DIR, "flights.json")
+INDEX_FILE = os.path.join(SCRIPT_DIR, "waypointToAcids.json")
+
+
+def parse_route_tokens(route):
+    """Route string -> list of waypoint tokens (whitespace separated)."""
+    if not route or not isinstance(route, str):
+        return []
+    return route.split()
+
+
+def build_waypoint_to_acids(flights):
+    """Returns: {"<waypoint>": ["ACID1", "ACID2", ...], ...}"""
+    waypoints = {}
+    for flight in flights or []:
+        acid = flight.get("ACID")
+        route = flight.get("route")
+        if not acid or not route:
+            continue
+        # dict.fromkeys keeps first-seen order, like the JS Set
+        for wp in dict.fromkeys(parse_route_tokens(route)):
+            waypoints.setdefault(wp, []).append(acid)
+    return waypoints
+
+
+def file_sha256(path):
+    """Hex SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_path(index_path):
+    """Sidecar file holding the flights.json hash the index was built from."""
+    return index_path + ".sha256"
+
+
+def _read_cached(index_path, flights_hash):
+    try:
+        with open(hash_path(index_path), "r") as f:
+            if f.read().strip() != flights_hash:
+                return None
+        with open(index_path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_waypoint_index(flights_path=FLIGHTS_FILE, index_path=INDEX_FILE, verbose=False):
+    """
+    Waypoint -> ACIDs map for flights_path, rebuilt only if flights_path changed.
+
+    The cache is plain waypointToAcids.json (same format as before) plus a
+    .sha256 sidecar. If the cache can't be written, the freshly built map is
+    still returned.
+    """
+    flights_hash = file_sha256(flights_path)
+    waypoints = _read_cached(index_path, flights_hash)
+    if waypoints is not None:
+        return waypoints
+
+    with open(flights_path, "r") as f:
+        waypoints = build_waypoint_to_acids(json.load(f))
+    if verbose:
+        print(f"Rebuilt waypoint index from {os.path.basename(flights_path)} "
+              f"({len(waypoints)} waypoints)")
+    try:
+        write_json_atomic(index_path, waypoints)
+        with open(hash_path(index_path), "w") as f:
+            f.write(flights_hash + "\n")
+    except OSError as e:
+        print(f"Warning: could not cache waypoint index at {index_path}: {e}")
+    return waypoints
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Usage: python WaypointIndex.py [flights.json] [--force]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    flights_path = args[0] if args else FLIGHTS_FILE
+    if '--force' in sys.argv and os.path.exists(hash_path(INDEX_FILE)):
+        os.remove(hash_path(INDEX_FILE))
+
+    waypoints = load_waypoint_index(flights_path, verbose=True)
+    print(f"Unique waypoints: {len(waypoints)}")
+    print("Top 10 busiest waypoints:")
+    busiest = sorted(waypoints.items(), key=lambda item: -len(item[1]))[:10]
+    for i, (wp, acids) in enumerate(busiest, 1):
+        print(f"  {i}) {wp} -> {len(acids)} flights")
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Pipeline benchmark on synthetic schedules (see ScheduleGenerator).
+
+For each schedule size, times each stage separately:
+    compile     trajectories + waypoint candidate index
+    simulation  producing the per-tick snapshots
+    detection   detect_conflicts_by_waypoints on every snapshot
+    dedup       merging ticks into events and dropping subset clusters
+    resolution  one conflict_resolver pass over an in-memory state
+then times raw detection end to end (detect_conflicts) per backend, both
+in-process and time-sharded over --workers processes, and writes the
+timings and counts as JSON, so runs from before and after a change can be
+compared with --compare.
+
+Usage: python benchmark.py [--sizes 250,1000,5000] [--seed 0] [--repeat 1] [--workers 4]
+                           [--out benchmark_results.json] [--compare OLD.json]
+"""
+
+import json
+import platform
+import sys
+import time
+
+from ConflictEvents import events_to_conflict_list
+from ConflictFinder import WaypointCandidates, detect_conflicts_by_waypoints
+from ConflictResolver import conflict_resolver
+from FlightPath import compile_flights, dedupe_conflict_events, detect_conflicts, iter_snapshots
+from ScheduleGenerator import generate_schedule
+from SimulationState import SimulationState
+from SnapshotEngine import numpy_available
+from WaypointIndex import build_waypoint_to_acids
+
+DEFAULT_SIZES = [250, 1000, 5000, 10000, 50000]
+STAGES = ["compile", "simulation", "detection", "dedup", "resolution"]
+PING_INT = 1
+DEFAULT_WORKERS = 4
+RESULTS_FILE = "benchmark_results.json"
+
+
+def run_pipeline(flights, ping_int=PING_INT):
+    """Run every stage once. Returns (timings in seconds, counts)."""
+    timings = dict.fromkeys(STAGES, 0.0)
+    counts = {}
+
+    start = time.perf_counter()
+    trajectories = compile_flights(flights)
+    candidates = WaypointCandidates(build_waypoint_to_acids(flights))
+    timings["compile"] = time.perf_counter() - start
+
+    # Snapshots are streamed; each next() is simulation, each call after it detection
+    conflicts = []
+    ticks = plane_ticks = 0
+    snapshots = iter_snapshots(flights, ping_int, trajectories=trajectories)
+    while True:
+        start = time.perf_counter()
+        snapshot = next(snapshots, None)
+        timings["simulation"] += time.perf_counter() - start
+        if snapshot is None:
+            break
+        ticks += 1
+        plane_ticks += len(snapshot["planes"])
+        start = time.perf_counter()
+        conflicts.extend(detect_conflicts_by_waypoints(snapshot["planes"], snapshot["timestamp"],
+                                                       candidates))
+        timings["detection"] += time.perf_counter() - start
+    counts["ticks"] = ticks
+    counts["plane_ticks"] = plane_ticks
+    counts["raw_conflicts"] = len(conflicts)
+
+    start = time.perf_counter()
+    events = dedupe_conflict_events(conflicts, ping_int)
+    deduped = events_to_conflict_list(events)
+    timings["dedup"] = time.perf_counter() - start
+    counts["conflicts"] = len(deduped)
+
+    state = SimulationState([dict(flight, changes=0) for flight in flights])
+    start = time.perf_counter()
+    conflict_resolver(deduped, state=state)
+    timings["resolution"] = time.perf_counter() - start
+    counts["planes_changed"] = len(state.dirty)
+
+    return timings, counts
+
+
+def detect_modes(workers):
+    """(label, backend, workers) for each end-to-end detection row."""
+    backends = ["python", "numpy"] if numpy_available() else ["python"]
+    modes = [(backend, backend, 1) for backend in backends]
+    modes += [(f"{backend} --workers", backend, workers) for backend in backends]
+    return modes
+
+
+def run_detect_modes(flights, workers, ping_int=PING_INT):
+    """Seconds for detect_conflicts in each mode. Every mode must give the same conflicts."""
+    timings = {}
+    expected = None
+    for label, backend, mode_workers in detect_modes(workers):
+        start = time.perf_counter()
+        conflicts = detect_conflicts(flights, ping_int, backend=backend, workers=mode_workers)
+        timings[label] = time.perf_counter() - start
+        if expected is None:
+            expected = conflicts
+        elif conflicts != expected:
+            print(f"  WARNING: {label} detection differs from {detect_modes(workers)[0][0]}")
+    return timings
+
+
+def benchmark(sizes, seed=0, repeat=1, workers=DEFAULT_WORKERS):
+    """Best-of-repeat timings per size. Returns the results dict written to JSON."""
+    runs = []
+    for n_flights in sizes:
+        start = time.perf_counter()
+        flights = generate_schedule(n_flights, seed=seed)
+        generate_s = time.perf_counter() - start
+
+        best = best_modes = None
+        for _ in range(repeat):
+            timings, counts = run_pipeline(flights)
+            mode_timings = run_detect_modes(flights, workers)
+            if best is None:
+                best, best_modes = timings, mode_timings
+            else:
+                best = {stage: min(best[stage], timings[stage]) for stage in STAGES}
+                best_modes = {mode: min(best_modes[mode], mode_timings[mode]) for mode in best_modes}
+        best["total"] = sum(best[stage] for stage in STAGES)
+
+        runs.append({
+            "flights": n_flights,
+            "generate_s": round(generate_s, 4),
+            "timings_s": {stage: round(seconds, 4) for stage, seconds in best.items()},
+            "detect_modes_s": {mode: round(seconds, 4) for mode, seconds in best_modes.items()},
+            "counts": counts,
+        })
+        print_run(runs[-1])
+
+    return {
+        "seed": seed,
+        "repeat": repeat,
+        "ping_int": PING_INT,
+        "workers": workers,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "runs": runs,
+    }
+
+
+def print_run(run):
+    timings = run["timings_s"]
+    counts = run["counts"]
+    print(f"\n{run['flights']} flights: {counts['conflicts']} conflicts "
+          f"({counts['raw_conflicts']} raw, {counts['ticks']} ticks)")
+    for stage in STAGES + ["total"]:
+        print(f"  {stage:<11} {timings[stage]:9.3f}s")
+    print("  detect_conflicts end to end:")
+    for mode, seconds in run.get("detect_modes_s", {}).items():
+        print(f"    {mode:<18} {seconds:9.3f}s")
+
+
+def compare(old, new):
+    """Print new/old time ratios per stage for sizes present in both results."""
+    old_runs = {run["flights"]: run for run in old["runs"]}
+    print(f"\n{'='*80}")
+    print("COMPARISON (new / old time; < 1.00 is faster)")
+    print(f"{'='*80}")
+    print(f"{'flights':>8} " + " ".join(f"{stage:>11}" for stage in STAGES + ["total"]))
+    for run in new["runs"]:
+        old_run = old_runs.get(run["flights"])
+        if old_run is None:
+            continue
+        ratios = []
+        for stage in STAGES + ["total"]:
+            before, after = old_run["timings_s"][stage], run["timings_s"][stage]
+            ratios.append(f"{after / before:11.2f}" if before > 0 else f"{'-':>11}")
+        print(f"{run['flights']:>8} " + " ".join(ratios))
+        old_modes = old_run.get("detect_modes_s", {})
+        for mode, after in run.get("detect_modes_s", {}).items():
+            before = old_modes.get(mode)
+            if before:
+                print(f"         detect {mode:<18} {after / before:6.2f}")
+        if old_run["counts"] != run["counts"]:
+            # Same seed and size should give the same conflicts; flag behaviour changes
+            print(f"         counts differ: {old_run['counts']} -> {run['counts']}")
+
+
+def main():
+    sizes = DEFAULT_SIZES
+    if '--sizes' in sys.argv:
+        sizes = [int(n) for n in sys.argv[sys.argv.index('--sizes') + 1].split(",")]
+    seed = int(sys.argv[sys.argv.index('--seed') + 1]) if '--seed' in sys.argv else 0
+    repeat = int(sys.argv[sys.argv.index('--repeat') + 1]) if '--repeat' in sys.argv else 1
+    workers = (int(sys.argv[sys.argv.index('--workers') + 1]) if '--workers' in sys.argv
+               else DEFAULT_WORKERS)
+    out = sys.argv[sys.argv.index('--out') + 1] if '--out' in sys.argv else RESULTS_FILE
+    compare_path = sys.argv[sys.argv.index('--compare') + 1] if '--compare' in sys.argv else None
+
+    print("=" * 80)
+    print(f"PIPELINE BENCHMARK (sizes: {', '.join(map(str, sizes))}; seed {seed}; "
+          f"{workers} workers)")
+    print("=" * 80)
+
+    results = benchmark(sizes, seed=seed, repeat=repeat, workers=workers)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {out}")
+
+    if compare_path is not None:
+        with open(compare_path, "r") as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,115 @@
 #!/usr/bin/env python3
 """
 Iterative conflict resolution script.
-Runs FlightPath.py multiple times until conflicts reach 0 or max iterations.
+Runs detection + resolution in-process (see ResolutionEngine) until conflicts
+reach 0 or max iterations.
 """
 
-import subprocess
 import json
-import os
+import signal
 import sys
+import time
+
+# Usage: python iterative_resolve.py --ndjson  (progress events as JSON lines on stdout; text goes to stderr)
+# stdout is swapped before the pipeline modules are imported, so nothing they
+# print (now or later) can end up between the events
+EVENT_OUT = None
+if __name__ == "__main__" and '--ndjson' in sys.argv:
+    EVENT_OUT = sys.stdout
+    sys.stdout = sys.stderr
+
+from BinaryState import export_json, json_to_binary
+from Instrumentation import metrics
+from ResolutionEngine import ResolutionEngine, MAX_ITERATIONS, SUCCESS_THRESHOLD
+from ResultCache import ResultCache, cache_key, DEFAULT_MAX_BYTES
+from SimulationState import write_json_atomic
 
-MAX_ITERATIONS = 100  # Safety limit to prevent infinite loops
 CONFLICTS_FILE = "conflicts.json"
+EVENTS_FILE = "conflict_events.json"
+STATE_JSON_FILE = "simulation_state.json"
+STATE_BINARY_FILE = "simulation_state.bin"
+FLIGHTS_FILE = "flights.json"
+AIRCRAFT_TYPES_FILE = "plane_info.json"
+PROFILE_FILE = "pipeline_profile.json"
+PING_INT = 1
 
-def get_conflict_count():
-    """Get the number of conflicts from conflicts.json"""
-    if not os.path.exists(CONFLICTS_FILE):
-        return None
-    
-    try:
-        with open(CONFLICTS_FILE, 'r') as f:
-            conflicts = json.load(f)
-        return len(conflicts)
-    except:
-        return None
-
-def run_flightpath():
-    """Run FlightPath.py with --no-reset flag"""
-    try:
-        result = subprocess.run(
-            [sys.executable, "FlightPath.py", "--no-reset"],
-            cwd=os.path.dirname(os.path.abspath(__file__)),
-            capture_output=True,
-            text=True,
-            timeout=300  # 5 minute timeout per iteration
-        )
-        return result.returncode == 0, result.stdout, result.stderr
-    except subprocess.TimeoutExpired:
-        return False, "", "Timeout after 5 minutes"
-    except Exception as e:
-        return False, "", str(e)
+def print_iteration(result):
+    """Per-iteration progress line (called by the engine after each iteration)"""
+    print(f"\n{'='*80}")
+    print(f"ITERATION {result['iteration']}")
+    print(f"{'='*80}")
+    print(f"\n✓ Conflicts detected: {result['conflicts']}")
+
+def ndjson_writer(out):
+    """Callback writing each event as one JSON line to out, flushed so readers see it at once."""
+    def write_event(event):
+        out.write(json.dumps(event) + "\n")
+        out.flush()
+    return write_event
+
+def run_resolution(incremental, compact, binary, global_mode, check_moves, resolve_workers,
+                   on_iteration=print_iteration, should_stop=None, budget_s=None, keep_best=False):
+    """Run the engine on the state files. Returns (summary, unresolved ACIDs)."""
+    state_file = STATE_JSON_FILE
+    if binary:
+        json_to_binary(STATE_JSON_FILE, STATE_BINARY_FILE)
+        state_file = STATE_BINARY_FILE
+    engine = ResolutionEngine(state_file=state_file, ping_int=PING_INT, incremental=incremental,
+                              compact=compact, global_resolve=global_mode,
+                              resolve_workers=resolve_workers, check_moves=check_moves)
+    summary = engine.run(MAX_ITERATIONS, on_iteration=on_iteration, should_stop=should_stop,
+                         budget_s=budget_s, keep_best=keep_best)
+    engine.save(CONFLICTS_FILE, EVENTS_FILE)
+    if binary:
+        # The dashboard reads JSON; export it once at the end
+        export_json(STATE_BINARY_FILE, STATE_JSON_FILE)
+        print(f"State patched in place: {engine.state.binary.bytes_written} bytes written to {STATE_BINARY_FILE}")
+    return summary, engine.last_unresolved
+
+def result_key(incremental, global_mode, check_moves, keep_best=False):
+    """Result cache key for the current input files and the options that change the result."""
+    # compact/binary/resolve-workers give the same result, so they are not
+    # part of the key. Incremental detection finds the same conflicts but
+    # lists them in a different order, and the resolver's choices depend
+    # on that order.
+    return cache_key([FLIGHTS_FILE, STATE_JSON_FILE, AIRCRAFT_TYPES_FILE],
+                     ping_int=PING_INT, max_iterations=MAX_ITERATIONS, incremental=incremental,
+                     global_resolve=global_mode, check_moves=check_moves, keep_best=keep_best)
+
+def store_result(cache, key, summary, unresolved):
+    """Cache the files a run produced, so the same inputs can be answered from disk."""
+    with open(STATE_JSON_FILE, "r") as f:
+        state = json.load(f)
+    with open(EVENTS_FILE, "r") as f:
+        events = json.load(f)
+    cache.put(key, {
+        "state": state,
+        "conflicts": summary["final_conflicts"],
+        "events": events,
+        "summary": {k: v for k, v in summary.items() if k != "final_conflicts"},
+        "unresolved": unresolved,
+    })
+
+def restore_result(cached, on_iteration=print_iteration):
+    """Write a cached run's output files. Returns (summary, unresolved ACIDs)."""
+    write_json_atomic(STATE_JSON_FILE, cached["state"])
+    write_json_atomic(CONFLICTS_FILE, cached["conflicts"])
+    write_json_atomic(EVENTS_FILE, cached["events"])
+    for result in cached["summary"]["results"]:
+        on_iteration(result)
+    summary = dict(cached["summary"], final_conflicts=cached["conflicts"])
+    return summary, cached["unresolved"]
 
 def main():
+    on_iteration = print_iteration
+    emit = None
+    if EVENT_OUT is not None:
+        emit = ndjson_writer(EVENT_OUT)
+
+        def on_iteration(result):
+            print_iteration(result)
+            emit(dict(result, type="iteration"))
+
     print("=" * 80)
     print("ITERATIVE CONFLICT RESOLUTION")
     print("=" * 80)
@@ -49,129 +118,115 @@ def main():
     print("=" * 80)
     print()
     
-    iteration = 0
-    previous_count = None
-    stuck_count = 0
-    max_stuck_iterations = 5  # If same count for 5 iterations, consider it stuck
-    
-    # Track recent conflict counts to detect oscillation
-    recent_counts = []
-    oscillation_detected = False
+    # Flights, trajectories and state stay in memory across iterations.
+    # Usage: python iterative_resolve.py --incremental  (only re-check pairs the resolver touched)
+    incremental = '--incremental' in sys.argv
+    # Usage: python iterative_resolve.py --compact  (columnar FlightTable instead of dict-per-plane)
+    compact = '--compact' in sys.argv
+    # Usage: python iterative_resolve.py --binary  (mmapped simulation_state.bin, patched every iteration)
+    binary = '--binary' in sys.argv
+    # Usage: python iterative_resolve.py --global  (assign levels/speeds to all aircraft in one pass)
+    global_mode = '--global' in sys.argv
+    # Usage: python iterative_resolve.py --check-moves  (skip moves that would create new conflicts)
+    check_moves = '--check-moves' in sys.argv
+    # Usage: python iterative_resolve.py --resolve-workers 4  (independent conflict groups in parallel)
+    resolve_workers = int(sys.argv[sys.argv.index('--resolve-workers') + 1]) if '--resolve-workers' in sys.argv else 1
+    if check_moves and resolve_workers > 1:
+        # Move checks read the shared state, which worker processes don't have
+        print("Usage: --check-moves needs the in-process resolver; drop --resolve-workers or use --resolve-workers 1")
+        sys.exit(1)
+    # Usage: python iterative_resolve.py --budget 30  (stop after ~30s; the best state seen is saved)
+    budget_s = float(sys.argv[sys.argv.index('--budget') + 1]) if '--budget' in sys.argv else None
+    # Usage: python iterative_resolve.py --keep-best  (save the lowest-conflict state seen, not the last one)
+    keep_best = '--keep-best' in sys.argv or budget_s is not None
+    # Usage: python iterative_resolve.py --no-cache  (always re-run, even for inputs seen before)
+    use_cache = '--no-cache' not in sys.argv
+    # Usage: python iterative_resolve.py --cache-mb 512  (result cache size limit, LRU eviction)
+    cache_mb = int(sys.argv[sys.argv.index('--cache-mb') + 1]) if '--cache-mb' in sys.argv else None
+    # Usage: python iterative_resolve.py --profile  (per-stage timings/counters to pipeline_profile.json)
+    profile = '--profile' in sys.argv
+    start_time = time.time()
+    metrics.reset()
+
+    # SIGTERM cancels: the current iteration finishes and its state is saved
+    cancel_requested = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: cancel_requested.append(signum))
+
+    cache = key = cached = None
+    if use_cache:
+        cache = ResultCache(max_bytes=cache_mb * 1024 * 1024 if cache_mb is not None else DEFAULT_MAX_BYTES)
+        key = result_key(incremental, global_mode, check_moves, keep_best)
+        cached = cache.get(key)
+
+    if cached is not None:
+        print(f"Inputs unchanged since a previous run; using cached result {key[:12]}")
+        summary, unresolved = restore_result(cached, on_iteration=on_iteration)
+    else:
+        summary, unresolved = run_resolution(incremental, compact, binary, global_mode,
+                                             check_moves, resolve_workers, on_iteration=on_iteration,
+                                             should_stop=lambda: bool(cancel_requested),
+                                             budget_s=budget_s, keep_best=keep_best)
+        # Where a cancelled or timed-out run stopped depends on timing, not just the inputs
+        if cache is not None and summary["status"] not in ("cancelled", "timeout"):
+            store_result(cache, key, summary, unresolved)
+    if unresolved:
+        print(f"\nNo conflict-free level or speed found for: {', '.join(unresolved)}")
+    if profile:
+        metrics.print_report()
+        write_json_atomic(PROFILE_FILE, metrics.report())
+        print(f"Profile written to {PROFILE_FILE}")
     
-    results = []
+    results = summary["results"]
+    iteration = len(results)
+    status = summary["status"]
+    final_count = len(summary["final_conflicts"])
+    oscillation_detected = summary["oscillation"] is not None
     
-    while iteration < MAX_ITERATIONS:
-        iteration += 1
-        print(f"\n{'='*80}")
-        print(f"ITERATION {iteration}")
-        print(f"{'='*80}")
-        
-        # Run FlightPath
-        print("Running FlightPath.py --no-reset...")
-        success, stdout, stderr = run_flightpath()
-        
-        if not success:
-            print(f"ERROR: FlightPath.py failed!")
-            print(f"STDERR: {stderr}")
-            break
-        
-        # Get conflict count
-        conflict_count = get_conflict_count()
-        
-        if conflict_count is None:
-            print("ERROR: Could not read conflicts.json")
-            break
-        
-        # Show output (last few lines)
-        if stdout:
-            lines = stdout.strip().split('\n')
-            # Show last 10 lines of output
-            print("\nFlightPath output (last 10 lines):")
-            for line in lines[-10:]:
-                print(f"  {line}")
-        
-        print(f"\n✓ Conflicts detected: {conflict_count}")
-        
-        # Track results
-        results.append({
-            "iteration": iteration,
-            "conflicts": conflict_count,
-            "changed": previous_count != conflict_count if previous_count is not None else True
-        })
-        
-        # Track recent counts for oscillation detection
-        recent_counts.append(conflict_count)
-        if len(recent_counts) > 10:
-            recent_counts.pop(0)
-        
-        # Detect oscillation pattern (e.g., 2,3,4,2,3,4...)
-        if len(recent_counts) >= 6:
-            # Check if we're cycling through the same values
-            last_6 = recent_counts[-6:]
-            if len(set(last_6)) <= 3:  # Only 2-3 unique values
-                # Check if it's a repeating pattern
-                pattern_found = False
-                for pattern_len in [2, 3, 4]:
-                    if len(last_6) >= pattern_len * 2:
-                        pattern = last_6[-pattern_len:]
-                        prev_pattern = last_6[-pattern_len*2:-pattern_len]
-                        if pattern == prev_pattern:
-                            pattern_found = True
-                            oscillation_detected = True
-                            # If oscillating at 3 or fewer conflicts, that's success
-                            if max(pattern) <= 3:
-                                print(f"\n{'='*80}")
-                                print(f"✅ SUCCESS! Conflicts oscillating at {max(pattern)} (threshold: ≤3)")
-                                print(f"{'='*80}")
-                                print("Remaining conflicts likely occur at specific timestamps during flight")
-                                print("and cannot be resolved by adjusting initial state alone.")
-                            else:
-                                print(f"\n⚠️  OSCILLATION DETECTED: Pattern {pattern} repeating")
-                                print("   The resolver is creating new conflicts while resolving old ones.")
-                                print("   Stopping to avoid infinite loop.")
-                            break
-                if pattern_found:
-                    break
-        
-        # Check if stuck (same count for multiple iterations)
-        if previous_count == conflict_count:
-            stuck_count += 1
-            # If we're at 3 or fewer conflicts and stuck, that's success
-            if conflict_count <= 3:
-                print(f"\n{'='*80}")
-                print(f"✅ SUCCESS! Conflicts stabilized at {conflict_count} (threshold: ≤3)")
-                print(f"{'='*80}")
-                break
-            elif stuck_count >= max_stuck_iterations:
-                print(f"\n⚠️  STUCK: Conflict count has been {conflict_count} for {stuck_count} iterations")
-                print("   This likely means these conflicts cannot be resolved with current constraints.")
-                break
-        else:
-            stuck_count = 0
-        
-        # Check if resolved (0 conflicts) or success threshold reached (<= 3 conflicts)
-        if conflict_count == 0:
+    if status == "oscillating":
+        pattern = summary["oscillation"]
+        # If oscillating at 3 or fewer conflicts, that's success
+        if max(pattern) <= SUCCESS_THRESHOLD:
             print(f"\n{'='*80}")
-            print("✅ SUCCESS! All conflicts resolved!")
-            print(f"{'='*80}")
-            break
-        elif conflict_count <= 3:
-            print(f"\n{'='*80}")
-            print(f"✅ SUCCESS! Conflicts reduced to {conflict_count} (threshold: ≤3)")
+            print(f"✅ SUCCESS! Conflicts oscillating at {max(pattern)} (threshold: ≤3)")
             print(f"{'='*80}")
             print("Remaining conflicts likely occur at specific timestamps during flight")
             print("and cannot be resolved by adjusting initial state alone.")
-            break
-        
-        previous_count = conflict_count
+        else:
+            print(f"\n⚠️  OSCILLATION DETECTED: Pattern {pattern} repeating")
+            print("   The resolver is creating new conflicts while resolving old ones.")
+            print("   Stopping to avoid infinite loop.")
+    elif status == "stabilized":
+        print(f"\n{'='*80}")
+        print(f"✅ SUCCESS! Conflicts stabilized at {final_count} (threshold: ≤3)")
+        print(f"{'='*80}")
+    elif status == "cancelled":
+        print(f"\n⚠️  CANCELLED after {len(results)} iterations; state saved with {final_count} conflicts")
+    elif status == "timeout":
+        print(f"\n⚠️  TIME BUDGET ({budget_s:g}s) reached after {len(results)} iterations")
+    elif status == "stuck":
+        print(f"\n⚠️  STUCK: Conflict count has been {final_count} for several iterations")
+        print("   This likely means these conflicts cannot be resolved with current constraints.")
+    elif status == "resolved":
+        print(f"\n{'='*80}")
+        print("✅ SUCCESS! All conflicts resolved!")
+        print(f"{'='*80}")
+    elif status == "threshold":
+        print(f"\n{'='*80}")
+        print(f"✅ SUCCESS! Conflicts reduced to {final_count} (threshold: ≤3)")
+        print(f"{'='*80}")
+        print("Remaining conflicts likely occur at specific timestamps during flight")
+        print("and cannot be resolved by adjusting initial state alone.")
     
     # Summary
     print(f"\n{'='*80}")
     print("SUMMARY")
     print(f"{'='*80}")
     print(f"Total iterations: {iteration}")
-    print(f"Final conflict count: {get_conflict_count()}")
+    print(f"Final conflict count: {final_count}")
     print(f"Starting conflict count: {results[0]['conflicts'] if results else 'N/A'}")
+    if summary["best_iteration"] is not None:
+        print(f"Saved state: best seen, from iteration {summary['best_iteration']}")
+    print(f"Elapsed: {time.time() - start_time:.1f}s")
     
     if results:
         print(f"\nProgress:")
@@ -184,11 +239,10 @@ def main():
         print("   The remaining conflicts are likely unresolvable with current constraints")
         print("   or require a different resolution strategy.")
     
-    if iteration >= MAX_ITERATIONS:
+    if status == "max_iterations":
         print(f"\n⚠️  Reached maximum iterations ({MAX_ITERATIONS})")
         print("   Some conflicts may be unresolvable with current constraints.")
     
-    final_count = get_conflict_count()
     if final_count == 0:
         print(f"\n✅ All conflicts successfully resolved in {iteration} iterations!")
     elif final_count is not None and final_count <= 3:
@@ -203,6 +257,9 @@ def main():
         print("   - Conflicts occurring at specific timestamps during flight")
         print("   - Horizontal distance constraints")
 
+    if emit is not None:
+        emit({"type": "done", "status": status, "iterations": iteration, "conflicts": final_count})
+
 if __name__ == "__main__":
     main()
 
@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+Long-running conflict resolution service for the dashboard.
+
+Keeps the simulation state, compiled trajectories and waypoint index in
+memory between requests, instead of cold-starting iterative_resolve.py for
+every click. vite.config.js proxies /api/resolve-conflicts here and falls
+back to running iterative_resolve.py if the service isn't up.
+
+Runs that read or write the state files are serialised with one lock.
+Identical requests that arrive while one is running wait for that run and
+get its response, instead of queueing a second run. Resolution progress can
+be streamed (one event per iteration) and a running resolution cancelled.
+A request can set a time budget; the run then returns the lowest-conflict
+state it found when the budget runs out. New flight plans are checked against
+the traffic in memory (see FlightInsertion) without running anything else.
+
+Usage: python resolve_service.py [--port 8765] [--unix /tmp/resolve.sock]
+                                 [--incremental] [--global] [--check-moves] [--no-cache]
+                                 [--keep-best]
+
+Endpoints (JSON):
+    GET  /health               {"ok": true, ...}
+    POST /resolve[?profile=1]  run resolution; same fields as /api/resolve-conflicts
+         ?budget=SECONDS       stop within about SECONDS, keeping the best state seen
+         ?stream=ndjson|sse    stream progress instead: {"type": "iteration", ...} per
+                               iteration, then {"type": "result", ...the response}
+    POST /cancel               stop running resolutions after their current iteration
+    POST /detect               detect on the current state (cached by state content);
+                               nothing is written
+    POST /insert               body: one flights.json entry; conflict-free altitudes and
+                               speeds for it (see InsertionAdvisor.options)
+    GET  /state                simulation_state.json as last written
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from ConflictEvents import events_to_conflict_list
+from FlightInsertion import InsertionAdvisor
+from FlightPath import dedupe_conflict_events, detect_conflicts
+from Instrumentation import metrics
+from ResolutionEngine import ResolutionEngine, MAX_ITERATIONS
+from ResultCache import ResultCache
+from SimulationState import SimulationState
+from iterative_resolve import (CONFLICTS_FILE, EVENTS_FILE, PING_INT, STATE_JSON_FILE,
+                               restore_result, result_key, store_result)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_BODY_BYTES = 1024 * 1024
+
+STREAM_CONTENT_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+def file_signature(path):
+    """Changes whenever the file is replaced or rewritten."""
+    st = os.stat(path)
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def log_iteration(result):
+    print(f"  iteration {result['iteration']}: {result['conflicts']} conflicts", flush=True)
+
+
+class Run:
+    """One scheduled piece of work, shared by every request that asked for it."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.future = loop.create_future()
+        self.listeners = []               # asyncio.Queues receiving progress events
+        self.cancel = threading.Event()   # checked by the engine between iterations
+
+    def publish(self, event):
+        """Send an event to every listener; safe to call from the worker thread."""
+        for queue in list(self.listeners):
+            self.loop.call_soon_threadsafe(queue.put_nowait, event)
+
+
+class ResolutionService:
+    """Warm ResolutionEngine plus request serialisation and coalescing."""
+
+    def __init__(self, incremental=False, global_resolve=False, check_moves=False, use_cache=True,
+                 keep_best=False):
+        self.incremental = incremental
+        self.global_resolve = global_resolve
+        self.check_moves = check_moves
+        self.keep_best = keep_best
+        self.cache = ResultCache() if use_cache else None
+        self.lock = asyncio.Lock()   # one run touching the state files at a time
+        self.inflight = {}           # request key -> Run shared by identical requests
+        self.engine = None
+        self.advisor = None                    # InsertionAdvisor over the engine's state
+        self.advisor_lock = threading.Lock()   # advisor use, which may overlap a resolution
+        self._state_signature = None
+        self.requests = 0
+        self.coalesced = 0
+
+    # -------------------- Engine (runs in a worker thread) -------------------- #
+
+    def _current_engine(self):
+        """The warm engine, rebuilt only if simulation_state.json changed behind our back."""
+        signature = file_signature(STATE_JSON_FILE)
+        if self.engine is None or signature != self._state_signature:
+            state = SimulationState.load(STATE_JSON_FILE)
+            self.engine = ResolutionEngine(state=state, ping_int=PING_INT,
+                                           incremental=self.incremental,
+                                           global_resolve=self.global_resolve,
+                                           check_moves=self.check_moves)
+            self._state_signature = signature
+            print(f"Loaded {len(state)} planes from {STATE_JSON_FILE}", flush=True)
+        return self.engine
+
+    def _remember_state_file(self):
+        """Our own writes don't count as outside changes."""
+        self._state_signature = file_signature(STATE_JSON_FILE)
+
+    def resolve(self, run, profile=False, budget_s=None):
+        """One full resolution run, as iterative_resolve.py does it. Returns the response dict."""
+        metrics.reset()
+        start = time.time()
+        # A budgeted run may stop early, so it must end on the best state it saw
+        keep_best = self.keep_best or budget_s is not None
+        key = cached = None
+        if self.cache is not None:
+            key = result_key(self.incremental, self.global_resolve, self.check_moves, keep_best)
+            cached = self.cache.get(key)
+
+        def on_iteration(result):
+            log_iteration(result)
+            run.publish(dict(result, type="iteration"))
+
+        if cached is not None:
+            summary, unresolved = restore_result(cached, on_iteration=on_iteration)
+            # The restored state is a different file; reload it next time
+            self.engine = None
+        else:
+            engine = self._current_engine()
+            summary = engine.run(MAX_ITERATIONS, on_iteration=on_iteration,
+                                 should_stop=run.cancel.is_set, budget_s=budget_s,
+                                 keep_best=keep_best)
+            unresolved = engine.last_unresolved
+            engine.save(CONFLICTS_FILE, EVENTS_FILE)
+            self._remember_state_file()
+            if self.cache is not None and summary["status"] not in ("cancelled", "timeout"):
+                store_result(self.cache, key, summary, unresolved)
+
+        with open(EVENTS_FILE, "r") as f:
+            events = json.load(f)
+        response = {
+            "ok": True,
+            "conflicts": summary["final_conflicts"],
+            "events": events,
+            "summary": {
+                "status": summary["status"],
+                "iterations": len(summary["results"]),
+                "results": summary["results"],
+                "oscillation": summary["oscillation"],
+                "best_iteration": summary["best_iteration"],
+                "unresolved": unresolved,
+            },
+            "cached": cached is not None,
+            "elapsed_s": round(time.time() - start, 3),
+        }
+        if profile:
+            response["profile"] = metrics.report()
+        return response
+
+    def detect(self, run):
+        """Conflicts for the current state, without resolving or writing anything."""
+        engine = self._current_engine()
+        # Full detection as FlightPath.py does it, so the answer doesn't depend on
+        # the engine's mode and a state seen before is answered from the cache
+        raw = detect_conflicts(engine.state.planes, PING_INT, cache=self.cache)
+        events = dedupe_conflict_events(raw, PING_INT)
+        return {"ok": True, "conflicts": events_to_conflict_list(events), "events": events}
+
+    def _insert(self, flight, sync):
+        with self.advisor_lock:
+            if sync:
+                engine = self._current_engine()
+                if self.advisor is None or self.advisor.state is not engine.state:
+                    self.advisor = InsertionAdvisor(engine.state, PING_INT)
+            return self.advisor.options(flight, sync=sync)
+
+    # -------------------- Scheduling -------------------- #
+
+    async def run_exclusive(self, key, func, *args, listener=None):
+        """
+        Run func(run, *args) in a worker thread under the state lock.
+
+        A request with the same key as one already running or queued shares
+        that request's Run (and result) instead of running again.
+        listener: optional asyncio.Queue that receives the run's progress events.
+        """
+        self.requests += 1
+        run = self.inflight.get(key)
+        if run is not None:
+            self.coalesced += 1
+            if listener is not None:
+                run.listeners.append(listener)
+            try:
+                return await asyncio.shield(run.future)
+            finally:
+                if listener is not None:
+                    run.listeners.remove(listener)
+
+        run = Run(asyncio.get_running_loop())
+        if listener is not None:
+            run.listeners.append(listener)
+        self.inflight[key] = run
+        try:
+            async with self.lock:
+                result = await asyncio.to_thread(func, run, *args)
+            run.future.set_result(result)
+        except Exception as e:
+            run.future.set_exception(e)
+        finally:
+            del self.inflight[key]
+        # Retrieve the result (or exception) for this caller too
+        return run.future.result()
+
+    async def insert(self, flight):
+        """
+        Conflict-free levels and speeds for a new flight plan; nothing is written.
+
+        While a resolution holds the lock the state is changing, so the answer
+        is against the traffic as of the last sync ("stale": true) rather than
+        waiting for the run to finish.
+        """
+        stale = self.lock.locked() and self.advisor is not None
+        if stale:
+            result = await asyncio.to_thread(self._insert, flight, False)
+        else:
+            async with self.lock:
+                result = await asyncio.to_thread(self._insert, flight, True)
+        return dict(result, ok=True, stale=stale)
+
+    def cancel(self):
+        """Ask every running or queued resolution to stop. Returns how many were asked."""
+        runs = [run for key, run in self.inflight.items() if key[0] == "resolve"]
+        for run in runs:
+            run.cancel.set()
+        return len(runs)
+
+    async def stream_resolve(self, writer, profile, budget_s, fmt):
+        """Chunked response with one event per iteration, then the final response."""
+        queue = asyncio.Queue()
+        task = asyncio.ensure_future(
+            self.run_exclusive(("resolve", profile, budget_s), self.resolve, profile, budget_s,
+                               listener=queue))
+        await write_stream_head(writer, STREAM_CONTENT_TYPES[fmt])
+        connected = True
+        while True:
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+                break
+            connected = connected and await write_event(writer, getter.result(), fmt)
+        # Events published just before the run finished
+        while not queue.empty():
+            connected = connected and await write_event(writer, queue.get_nowait(), fmt)
+        try:
+            final = dict(task.result(), type="result")
+        except Exception as e:
+            final = {"type": "result", "ok": False, "error": "Resolution failed",
+                     "details": f"{type(e).__name__}: {e}"}
+        if connected and await write_event(writer, final, fmt):
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+
+    async def handle(self, method, path, query, body=b""):
+        """Returns (HTTP status, response dict)."""
+        if path == "/health":
+            return 200, {"ok": True, "requests": self.requests, "coalesced": self.coalesced,
+                         "busy": self.lock.locked()}
+        if path == "/state":
+            if method != "GET":
+                return 405, {"ok": False, "error": "Method Not Allowed"}
+            with open(STATE_JSON_FILE, "r") as f:
+                return 200, {"ok": True, "state": json.load(f)}
+        if path == "/resolve":
+            if method != "POST":
+                return 405, {"ok": False, "error": "Method Not Allowed"}
+            profile = query.get("profile", ["0"])[0] == "1"
+            try:
+                budget_s = query_budget(query)
+            except ValueError as e:
+                return 400, {"ok": False, "error": str(e)}
+            return 200, await self.run_exclusive(("resolve", profile, budget_s), self.resolve,
+                                                 profile, budget_s)
+        if path == "/cancel":
+            if method != "POST":
+                return 405, {"ok": False, "error": "Method Not Allowed"}
+            return 200, {"ok": True, "cancelled": self.cancel()}
+        if path == "/detect":
+            if method != "POST":
+                return 405, {"ok": False, "error": "Method Not Allowed"}
+            return 200, await self.run_exclusive(("detect",), self.detect)
+        if path == "/insert":
+            if method != "POST":
+                return 405, {"ok": False, "error": "Method Not Allowed"}
+            try:
+                flight = json.loads(body)
+                if not isinstance(flight, dict):
+                    raise ValueError("body must be one flight plan (a JSON object)")
+                return 200, await self.insert(flight)
+            except ValueError as e:
+                return 400, {"ok": False, "error": str(e)}
+        return 404, {"ok": False, "error": "Not Found"}
+
+
+def query_budget(query):
+    """?budget=SECONDS as a float, or None. Raises ValueError for anything else."""
+    value = query.get("budget", [None])[0]
+    if value is None:
+        return None
+    budget_s = float(value)
+    if not budget_s > 0:
+        raise ValueError("budget must be a positive number of seconds")
+    return budget_s
+
+
+# -------------------- Minimal HTTP/1.1 over asyncio streams -------------------- #
+
+async def read_request(reader):
+    """Returns (method, target, body) or None if the client closed the connection."""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, target, _ = request_line.decode("latin-1").split(" ", 2)
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value.strip())
+    if length > MAX_BODY_BYTES:
+        raise ValueError("request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, target, body
+
+
+async def write_stream_head(writer, content_type):
+    writer.write(("HTTP/1.1 200 OK\r\n"
+                  f"Content-Type: {content_type}\r\n"
+                  "Cache-Control: no-cache\r\n"
+                  "Transfer-Encoding: chunked\r\n"
+                  "Connection: close\r\n\r\n").encode("latin-1"))
+    await writer.drain()
+
+
+async def write_event(writer, event, fmt):
+    """Write one event as a chunk (NDJSON line or SSE message). Returns False if the client left."""
+    line = json.dumps(event)
+    data = (f"data: {line}\n\n" if fmt == "sse" else line + "\n").encode("utf-8")
+    try:
+        writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+        await writer.drain()
+    except ConnectionError:
+        return False
+    return True
+
+
+async def write_response(writer, status, payload):
+    body = json.dumps(payload).encode("utf-8")
+    head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n")
+    writer.write(head.encode("latin-1") + body)
+    await writer.drain()
+
+
+def make_handler(service):
+    async def handle_connection(reader, writer):
+        try:
+            try:
+                request = await read_request(reader)
+            except ValueError as e:
+                await write_response(writer, 413 if "too large" in str(e) else 400,
+                                     {"ok": False, "error": str(e)})
+                return
+            if request is None:
+                return
+            method, target, body = request
+            url = urlsplit(target)
+            query = parse_qs(url.query)
+            fmt = query.get("stream", [None])[0]
+            if url.path == "/resolve" and method == "POST" and fmt in STREAM_CONTENT_TYPES:
+                try:
+                    budget_s = query_budget(query)
+                except ValueError as e:
+                    await write_response(writer, 400, {"ok": False, "error": str(e)})
+                    return
+                # A client that goes away doesn't cancel the run; others may share it
+                await service.stream_resolve(writer, query.get("profile", ["0"])[0] == "1",
+                                             budget_s, fmt)
+                return
+            try:
+                status, payload = await service.handle(method, url.path, query, body)
+            except Exception as e:
+                status, payload = 500, {"ok": False, "error": "Resolution failed",
+                                        "details": f"{type(e).__name__}: {e}"}
+            await write_response(writer, status, payload)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+    return handle_connection
+
+
+async def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None):
+    handler = make_handler(service)
+    if unix_path is not None:
+        if os.path.exists(unix_path):
+            os.remove(unix_path)
+        server = await asyncio.start_unix_server(handler, path=unix_path)
+        print(f"Resolution service listening on {unix_path}", flush=True)
+    else:
+        server = await asyncio.start_server(handler, host, port)
+        print(f"Resolution service listening on http://{host}:{port}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    # State and output files are relative to src/db, as for iterative_resolve.py
+    os.chdir(SCRIPT_DIR)
+    port = int(sys.argv[sys.argv.index('--port') + 1]) if '--port' in sys.argv else DEFAULT_PORT
+    unix_path = sys.argv[sys.argv.index('--unix') + 1] if '--unix' in sys.argv else None
+    service = ResolutionService(incremental='--incremental' in sys.argv,
+                                global_resolve='--global' in sys.argv,
+                                check_moves='--check-moves' in sys.argv,
+                                use_cache='--no-cache' not in sys.argv,
+                                keep_best='--keep-best' in sys.argv)
+    try:
+        asyncio.run(serve(service, port=port, unix_path=unix_path))
+    except KeyboardInterrupt:
+        print("\nResolution service stopped.")
+
+
+if __name__ == "__main__":
+    main()
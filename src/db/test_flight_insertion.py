@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Test script for InsertionAdvisor.
+Checks that malformed flight plans are rejected with ValueError, that a
+well-formed one gets options back, and that departures off the whole
+minute are sampled the way the simulator reports them.
+"""
+
+import json
+import os
+
+from FlightInsertion import InsertionAdvisor
+from FlightPath import compile_flights, detect_conflicts, simulation_ticks
+from SimulationState import SimulationState
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_flights():
+    with open(os.path.join(SCRIPT_DIR, "flights.json"), "r") as f:
+        return json.load(f)
+
+
+def make_advisor(count=50):
+    """An advisor over the first count flights of flights.json"""
+    flights = load_flights()
+    return InsertionAdvisor(SimulationState(flights[:count])), flights[count]
+
+
+def shift_departure(flight, seconds=37):
+    return dict(flight, **{"departure time": flight["departure time"] + seconds})
+
+
+def new_flight(template, **changes):
+    """A copy of template under an unscheduled ACID, with changes applied"""
+    flight = dict(template, ACID="TEST001")
+    for key, value in changes.items():
+        flight[key.replace("_", " ")] = value
+    return flight
+
+
+def assert_rejected(advisor, flight, message, sync=True):
+    try:
+        advisor.options(flight, sync=sync)
+    except ValueError as e:
+        assert message in str(e), f"expected {message!r}, got {e!r}"
+    else:
+        raise AssertionError(f"{flight} was accepted")
+
+
+def test_valid_flight_gets_options():
+    advisor, template = make_advisor()
+    result = advisor.options(new_flight(template))
+    print(f"  {result['acid']}: {len(result['options'])} speeds, filed "
+          f"{'conflict free' if result['filed']['conflict_free'] else 'in conflict'}")
+    assert result["acid"] == "TEST001"
+    assert result["options"]
+
+
+def test_rejects_non_numeric_altitude():
+    advisor, template = make_advisor()
+    assert_rejected(advisor, new_flight(template, altitude="high"), "altitude must be a finite number")
+    assert_rejected(advisor, new_flight(template, altitude=True), "altitude must be a finite number")
+
+
+def test_rejects_non_finite_altitude():
+    advisor, template = make_advisor()
+    assert_rejected(advisor, new_flight(template, altitude=float("nan")), "altitude must be a finite number")
+    assert_rejected(advisor, new_flight(template, altitude=float("inf")), "altitude must be a finite number")
+
+
+def test_rejects_negative_altitude():
+    advisor, template = make_advisor()
+    assert_rejected(advisor, new_flight(template, altitude=-1000), "altitude must not be negative")
+
+
+def test_rejects_non_numeric_speed():
+    advisor, template = make_advisor()
+    assert_rejected(advisor, new_flight(template, aircraft_speed="fast"), "aircraft speed must be a finite number")
+    assert_rejected(advisor, new_flight(template, aircraft_speed=float("nan")), "aircraft speed must be a finite number")
+
+
+def test_rejects_non_positive_speed():
+    advisor, template = make_advisor()
+    assert_rejected(advisor, new_flight(template, aircraft_speed=0), "aircraft speed must be positive")
+    assert_rejected(advisor, new_flight(template, aircraft_speed=-450.0), "aircraft speed must be positive")
+
+
+def test_rejects_bad_departure_time():
+    advisor, template = make_advisor()
+    assert_rejected(advisor, new_flight(template, departure_time="noon"), "departure time must be a finite number")
+    assert_rejected(advisor, new_flight(template, departure_time=float("inf")), "departure time must be a finite number")
+    assert_rejected(advisor, new_flight(template, departure_time=1767780000.5), "departure time must be a whole number")
+
+
+def test_rejects_non_string_fields():
+    advisor, template = make_advisor()
+    assert_rejected(advisor, new_flight(template, ACID=42), "ACID must be a string")
+    assert_rejected(advisor, new_flight(template, route=["A", "B"]), "route must be a string")
+
+
+def test_rejects_missing_and_duplicate():
+    advisor, template = make_advisor()
+    flight = new_flight(template)
+    del flight["altitude"]
+    assert_rejected(advisor, flight, "missing altitude")
+    assert_rejected(advisor, new_flight(template, ACID=advisor.state.planes[0]["ACID"]), "already scheduled")
+
+
+class UnreadableState:
+    """Stands in for a state another thread is changing: any access fails"""
+
+    def __getattr__(self, name):
+        raise AssertionError(f"state.{name} read without sync")
+
+    def __contains__(self, acid):
+        raise AssertionError("state membership read without sync")
+
+
+def test_unsynced_options_do_not_read_the_state():
+    advisor, template = make_advisor()
+    scheduled = advisor.state.planes[0]["ACID"]
+    advisor.state = UnreadableState()
+    result = advisor.options(new_flight(template), sync=False)
+    assert result["options"]
+    assert_rejected(advisor, new_flight(template, ACID=scheduled), "already scheduled", sync=False)
+
+
+def test_samples_off_minute_departures_like_the_simulator():
+    """Scheduled flights are sampled at every tick where the simulator reports them"""
+    flights = [shift_departure(flight) if i % 2 else flight
+               for i, flight in enumerate(load_flights()[:50])]
+    advisor = InsertionAdvisor(SimulationState(flights))
+    start = flights[0]["departure time"]
+    ticks = simulation_ticks(flights, 1)
+    wrong = []
+    for traj in compile_flights(flights):
+        airborne = {(tick - start) // 60 for tick in ticks
+                    if 0 < int((tick - traj.departure_unix) / 60) < traj.total_minutes}
+        if set(advisor.detector.positions[traj.acid]) != airborne:
+            wrong.append(traj.acid)
+    print(f"  {len(flights) - len(wrong)}/{len(flights)} flights sampled at the simulator's ticks")
+    assert not wrong, f"{wrong[:5]} sampled at the wrong ticks"
+
+
+def test_off_minute_new_flight_matches_full_detection():
+    """The filed conflicts of an off-minute flight are the ones a full re-run finds"""
+    flights = load_flights()
+    advisor = InsertionAdvisor(SimulationState(flights[:200]))
+    flight = shift_departure(new_flight(flights[200]))
+    result = advisor.options(flight)
+    full = detect_conflicts(flights[:200] + [flight], 1)
+    expected = {(other, conflict[-1]) for conflict in full if flight["ACID"] in conflict[:-1]
+                for other in conflict[:-1] if other != flight["ACID"]}
+    actual = {(other, tick) for other, ticks in result["filed"]["conflicts"].items() for tick in ticks}
+    print(f"  {len(actual)} conflicting (flight, tick) pairs, {len(expected)} from full detection")
+    assert expected, "the shifted flight should be in conflict for this check to mean anything"
+    assert actual == expected, f"advisor only: {actual - expected}, full only: {expected - actual}"
+
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("FLIGHT INSERTION TEST")
+    print("=" * 80)
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"  ok  {name}")
+    print("\n" + "=" * 80)
+    print("TEST COMPLETE")
+    print("=" * 80)
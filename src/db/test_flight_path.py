@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test script for the snapshot simulators in FlightPath.
+Checks that the interval-sweep Python path, the NumPy grid and the
+incremental detector agree when departures are not on a whole minute.
+"""
+
+import json
+import os
+
+from FlightPath import compile_flights, detect_conflicts, iter_snapshots, simulation_ticks
+from IncrementalDetector import IncrementalDetector
+from SnapshotEngine import numpy_available
+from WaypointIndex import build_waypoint_to_acids
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def shifted_schedule(count=300):
+    """The first count flights of flights.json, every other one departing 37 s late"""
+    with open(os.path.join(SCRIPT_DIR, "flights.json"), "r") as f:
+        flights = json.load(f)[:count]
+    return [dict(flight, **{"departure time": flight["departure time"] + (37 if i % 2 else 0)})
+            for i, flight in enumerate(flights)]
+
+
+def airborne_acids(snapshots):
+    return [(snapshot["timestamp"], [plane["ACID"] for plane in snapshot["planes"]])
+            for snapshot in snapshots]
+
+
+def test_python_sweep_matches_simulator_rule():
+    """Every plane the per-flight rule reports is in the sweep's snapshot, and nothing else"""
+    flights = shifted_schedule()
+    trajectories = compile_flights(flights)
+    expected = []
+    for tick_unix in simulation_ticks(flights, 1, trajectories):
+        acids = [traj.acid for traj in trajectories
+                 if 0 < int((tick_unix - traj.departure_unix) / 60) < traj.total_minutes]
+        expected.append(((tick_unix - flights[0]["departure time"]) // 60, acids))
+    actual = airborne_acids(iter_snapshots(flights, 1, trajectories=trajectories))
+    mismatched = [e[0] for e, a in zip(expected, actual) if e != a]
+    print(f"  {len(actual)} ticks, {len(mismatched)} differ from the simulator rule")
+    assert len(actual) == len(expected)
+    assert not mismatched, f"ticks {mismatched[:10]} differ"
+
+
+def test_python_sweep_matches_numpy_grid():
+    if not numpy_available():
+        print("  numpy not installed, skipped")
+        return
+    flights = shifted_schedule()
+    trajectories = compile_flights(flights)
+    python = airborne_acids(iter_snapshots(flights, 1, trajectories=trajectories))
+    grid = airborne_acids(iter_snapshots(flights, 1, backend="numpy", trajectories=trajectories))
+    mismatched = [p[0] for p, g in zip(python, grid) if p != g]
+    print(f"  {len(python)} ticks, {len(mismatched)} differ from simulate_grid")
+    assert len(python) == len(grid)
+    assert not mismatched, f"ticks {mismatched[:10]} differ"
+
+
+def test_incremental_detection_matches_full():
+    """IncrementalDetector samples the same ticks as the snapshot sweep"""
+    flights = shifted_schedule(1000)
+    full = detect_conflicts(flights, 1)
+    detector = IncrementalDetector(1, waypoints=build_waypoint_to_acids(flights))
+    incremental = detector.full(flights, compile_flights(flights))
+    clusters = lambda conflicts: {(frozenset(c[:-1]), c[-1]) for c in conflicts}
+    differing = clusters(full) ^ clusters(incremental)
+    print(f"  {len(full)} raw conflicts, {len(differing)} clusters differ")
+    assert not differing, f"{sorted(differing, key=lambda c: c[1])[:5]} differ"
+
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("FLIGHT PATH TEST")
+    print("=" * 80)
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"  ok  {name}")
+    print("\n" + "=" * 80)
+    print("TEST COMPLETE")
+    print("=" * 80)
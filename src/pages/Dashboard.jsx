@@ -191,6 +191,41 @@ function formatTimestamp(timestamp) {
   return new Date(timestamp * 1000).toLocaleString();
 }
 
+// Reads the NDJSON stream from /api/resolve-conflicts/stream. Calls onIteration for each
+// {"type": "iteration"} event and returns the final {"type": "result"} event.
+async function readResolveStream(response, onIteration) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let result = null;
+
+  const handleLine = (line) => {
+    if (!line.trim()) return;
+    let event;
+    try {
+      event = JSON.parse(line);
+    } catch {
+      // Not an event (e.g. a stray log line from the resolver); skip it
+      console.warn("Skipping non-JSON line in resolve stream:", line);
+      return;
+    }
+    if (event.type === "iteration") onIteration(event);
+    else if (event.type === "result") result = event;
+  };
+
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split("\n");
+    buffer = lines.pop();
+    lines.forEach(handleLine);
+  }
+  handleLine(buffer);
+
+  return result || { ok: false, error: "Resolution stream ended without a result" };
+}
+
 export default function Dashboard() {
   const { flights, waypointToAcids } = useFlightsData();
   const stats = useMemo(() => computeDashboardStats(flights), [flights]);
@@ -414,6 +449,15 @@ export default function Dashboard() {
     return `${acids.sort().join(',')}:${timestamp}`;
   }
 
+  async function handleCancelResolve() {
+    setResolveProgress((prev) => (prev ? { ...prev, status: "Cancelling after this iteration..." } : prev));
+    try {
+      await fetch("/api/resolve-conflicts/cancel", { method: "POST" });
+    } catch (error) {
+      console.error("Cancel failed:", error);
+    }
+  }
+
   async function handleResolveConflicts() {
     if (!analysisResults || !analysisResults.conflicts || analysisResults.conflicts.length === 0) {
       alert("Please run analysis first to detect conflicts.");
@@ -424,11 +468,20 @@ export default function Dashboard() {
     setResolveProgress({ iteration: 0, conflicts: analysisResults.conflicts.length, status: "Starting..." });
 
     try {
-      const response = await fetch("/api/resolve-conflicts", {
+      // Progress streams in one event per iteration, so convergence shows live
+      const response = await fetch("/api/resolve-conflicts/stream", {
         method: "POST",
       });
 
-      const data = await response.json();
+      const data = await readResolveStream(response, (event) => {
+        setResolveProgress({
+          iteration: event.iteration,
+          conflicts: event.conflicts,
+          status: event.oscillation
+            ? `Oscillating between ${event.oscillation.join(" / ")} conflicts...`
+            : `Resolving... (${event.elapsed_s.toFixed(1)}s)`,
+        });
+      });
 
       if (!data.ok) {
         console.error("Conflict resolution error:", data);
@@ -769,6 +822,11 @@ export default function Dashboard() {
                     Iteration: {resolveProgress.iteration} | Conflicts: {resolveProgress.conflicts}
                   </p>
                 )}
+                {resolving && (
+                  <button onClick={handleCancelResolve} className="cancel-resolve-button">
+                    Cancel
+                  </button>
+                )}
               </div>
             )}
             {analysisResults && (
@@ -1,9 +1,27 @@
 import { defineConfig } from 'vite'
 import react from '@vitejs/plugin-react'
-import { execFile } from 'node:child_process'
+import { execFile, spawn } from 'node:child_process'
 import fs from 'node:fs'
 import path from 'node:path'
 
+// Long-running resolver (src/db/resolve_service.py); if it isn't running the
+// middleware falls back to spawning iterative_resolve.py per request
+const RESOLVE_SERVICE_URL = process.env.RESOLVE_SERVICE_URL || 'http://127.0.0.1:8765'
+
+// Forward a request to the resolve service. Resolves to null if the service is unreachable.
+async function callResolveService(servicePath) {
+  try {
+    const response = await fetch(`${RESOLVE_SERVICE_URL}${servicePath}`, { method: 'POST' })
+    return { status: response.status, body: await response.text() }
+  } catch {
+    return null
+  }
+}
+
+// Resolver started by the NDJSON fallback (no service running), so it can be cancelled.
+// Only one runs at a time: a second would write simulation_state.json alongside it.
+let streamingChild = null
+
 // https://vite.dev/config/
 export default defineConfig({
   plugins: [
@@ -11,6 +29,102 @@ export default defineConfig({
     {
       name: 'iterative-conflict-resolver',
       configureServer(server) {
+        // Live progress: one JSON line per iteration ({"type": "iteration", ...}), then
+        // {"type": "result", ok, conflicts, events, ...}. Registered before
+        // /api/resolve-conflicts, which would otherwise match this path as a prefix.
+        server.middlewares.use('/api/resolve-conflicts/stream', async (req, res) => {
+          if (req.method !== 'POST') {
+            res.statusCode = 405
+            res.setHeader('Content-Type', 'application/json')
+            res.end(JSON.stringify({ ok: false, error: 'Method Not Allowed' }))
+            return
+          }
+
+          res.setHeader('Content-Type', 'application/x-ndjson')
+          res.setHeader('Cache-Control', 'no-cache')
+
+          let serviceResponse = null
+          try {
+            serviceResponse = await fetch(`${RESOLVE_SERVICE_URL}/resolve?stream=ndjson`, { method: 'POST' })
+          } catch {
+            serviceResponse = null
+          }
+          if (serviceResponse) {
+            res.statusCode = serviceResponse.status
+            try {
+              for await (const chunk of serviceResponse.body) {
+                res.write(chunk)
+              }
+            } finally {
+              res.end()
+            }
+            return
+          }
+
+          // No service: run the resolver here; --ndjson prints the same iteration events
+          if (streamingChild) {
+            res.statusCode = 409
+            res.end(JSON.stringify({
+              type: 'result',
+              ok: false,
+              error: 'A resolution is already running; cancel it or wait for it to finish',
+            }) + '\n')
+            return
+          }
+          const scriptDir = path.resolve('src/db')
+          const child = spawn('python3', [path.resolve('src/db/iterative_resolve.py'), '--ndjson'], { cwd: scriptDir })
+          streamingChild = child
+          let stderr = ''
+          child.stdout.on('data', (chunk) => res.write(chunk))
+          child.stderr.on('data', (chunk) => {
+            stderr = (stderr + chunk).slice(-64 * 1024)
+          })
+          child.on('close', (code) => {
+            if (streamingChild === child) streamingChild = null
+            let result
+            if (code !== 0) {
+              result = { type: 'result', ok: false, error: 'Python execution failed', details: stderr }
+            } else {
+              try {
+                const conflicts = JSON.parse(fs.readFileSync(path.join(scriptDir, 'conflicts.json'), 'utf8'))
+                const eventsPath = path.join(scriptDir, 'conflict_events.json')
+                const events = fs.existsSync(eventsPath) ? JSON.parse(fs.readFileSync(eventsPath, 'utf8')) : null
+                result = { type: 'result', ok: true, conflicts, events }
+              } catch (readErr) {
+                result = { type: 'result', ok: false, error: 'Failed to read/parse conflicts.json', details: String(readErr.message) }
+              }
+            }
+            res.end(JSON.stringify(result) + '\n')
+          })
+        })
+
+        // Stop a streaming run after its current iteration; the state so far is saved
+        server.middlewares.use('/api/resolve-conflicts/cancel', async (req, res) => {
+          if (req.method !== 'POST') {
+            res.statusCode = 405
+            res.setHeader('Content-Type', 'application/json')
+            res.end(JSON.stringify({ ok: false, error: 'Method Not Allowed' }))
+            return
+          }
+
+          let cancelled = 0
+          const serviceResponse = await callResolveService('/cancel')
+          if (serviceResponse) {
+            try {
+              cancelled += JSON.parse(serviceResponse.body).cancelled || 0
+            } catch {
+              // Service answered with something other than JSON; nothing was cancelled there
+            }
+          }
+          if (streamingChild) {
+            streamingChild.kill('SIGTERM')
+            cancelled += 1
+          }
+          res.statusCode = 200
+          res.setHeader('Content-Type', 'application/json')
+          res.end(JSON.stringify({ ok: true, cancelled }))
+        })
+
         server.middlewares.use('/api/resolve-conflicts', async (req, res) => {
           if (req.method !== 'POST') {
             res.statusCode = 405
@@ -21,13 +135,26 @@ export default defineConfig({
 
           const scriptPath = path.resolve('src/db/iterative_resolve.py')
           const conflictsPath = path.resolve('src/db/conflicts.json')
+          const eventsPath = path.resolve('src/db/conflict_events.json')
+          const profilePath = path.resolve('src/db/pipeline_profile.json')
           const scriptDir = path.resolve('src/db')
+          // POST /api/resolve-conflicts?profile=1 adds per-stage timings/counters to the response
+          const wantProfile = new URL(req.url, 'http://localhost').searchParams.get('profile') === '1'
+          const args = wantProfile ? [scriptPath, '--profile'] : [scriptPath]
+
+          const serviceResponse = await callResolveService(wantProfile ? '/resolve?profile=1' : '/resolve')
+          if (serviceResponse) {
+            res.statusCode = serviceResponse.status
+            res.setHeader('Content-Type', 'application/json')
+            res.end(serviceResponse.body)
+            return
+          }
 
           try {
             // Run iterative resolver (must run from src/db directory)
             execFile(
               'python3',
-              [scriptPath],
+              args,
               { cwd: scriptDir, maxBuffer: 50 * 1024 * 1024 },
               (err, stdout, stderr) => {
                 if (err) {
@@ -47,6 +174,17 @@ export default defineConfig({
                   // Read updated conflicts
                   const raw = fs.readFileSync(conflictsPath, 'utf8')
                   const conflicts = JSON.parse(raw)
+
+                  // Optional: same conflicts with start/end/duration (minutes)
+                  let events = null
+                  if (fs.existsSync(eventsPath)) {
+                    events = JSON.parse(fs.readFileSync(eventsPath, 'utf8'))
+                  }
+
+                  let profile = null
+                  if (wantProfile && fs.existsSync(profilePath)) {
+                    profile = JSON.parse(fs.readFileSync(profilePath, 'utf8'))
+                  }
                   
                   res.statusCode = 200
                   res.setHeader('Content-Type', 'application/json')
@@ -54,6 +192,8 @@ export default defineConfig({
                     JSON.stringify({
                       ok: true,
                       conflicts,
+                      events,
+                      profile,
                       stdout: String(stdout || ''),
                     })
                   )